@@ -4,6 +4,14 @@ import json
 #   MAIN
 #-----------------------------------------------------------
 
+def precisionItem(value):
+    """ ATTRIBUTE=DECIMALS -> (attribute, decimals) """
+    from argparse import ArgumentTypeError
+    name, separator, decimals = value.partition("=")
+    if not name or not separator or not decimals.isdigit():
+        raise ArgumentTypeError("expected ATTRIBUTE=DECIMALS, got %r" % value)
+    return name, int(decimals)
+
 def main(args):
     from argparse import ArgumentParser
 
@@ -12,31 +20,61 @@ def main(args):
     parser.add_argument("--file", required=True, type=str)
     parser.add_argument("--texture-path", type=str, nargs="*")
     parser.add_argument("--threejs", type=str, help="Export as threejs object")
+    parser.add_argument("--glb", type=str, help="Export as binary glTF")
+    parser.add_argument("--buffer-geometry", action="store_true", default=False, help="Export meshes as BufferGeometry")
+    parser.add_argument("--compact", action="store_true", default=False, help="No whitespace, shortest float32 numbers")
+    parser.add_argument("--precision", type=precisionItem, nargs="*", default=[], metavar="ATTRIBUTE=DECIMALS",
+        help="Round floats of position, normal, uv or matrix, e.g. position=4 normal=3")
+    parser.add_argument("--texture-size", type=int, default=None, metavar="PIXELS",
+        help="Limit exported textures to this size, using smaller dds mip levels")
+    parser.add_argument("--ktx", action="store_true", default=False,
+        help="Copy the DXT blocks of dds textures to KTX files instead of converting them to jpeg")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N", help="Convert textures in N processes")
+    parser.add_argument("--texture-cache", type=str, metavar="DIR", help="Reuse converted textures from this folder")
+    parser.add_argument("--texture-cache-size", type=int, default=1024, metavar="MB", help="Size limit of the texture cache")
+    parser.add_argument("--atlas", type=int, default=None, metavar="SIZE", help="Pack small textures into atlases of SIZE x SIZE")
+    parser.add_argument("--atlas-threshold", type=int, default=256, metavar="PIXELS", help="Largest texture packed into an atlas")
+    parser.add_argument("--info", action="store_true", default=False, help="Print a summary from the chunk headers only")
     options = parser.parse_args()
 
     if options.debug:
         logging.getLogger().setLevel(logging.DEBUG)
 
     import w3d
+    if options.info:
+        print(json.dumps(w3d.W3DModel.inspect(options.file), indent=2))
+        return
+
     model = w3d.W3DModel.from_file(options.file)
+    texture_cache = None
+    if options.texture_cache:
+        from w3d.texturecache import TextureCache
+        texture_cache = TextureCache(options.texture_cache, max_bytes=options.texture_cache_size << 20)
+    precision = dict(options.precision)
+    output = dict(buffer_geometry=options.buffer_geometry, indent=2, compact=options.compact, precision=precision,
+        max_texture_size=options.texture_size, compressed_textures=options.ktx,
+        jobs=options.jobs, texture_cache=texture_cache, atlas_size=options.atlas, atlas_threshold=options.atlas_threshold)
 
     if 0:
         import yaml
-        from mathutils import Vector, Quaternion
-        yaml.add_representer(Vector, lambda dumper, vector: dumper.represent_scalar('Vector', '%s, %s, %s' % (vector.x, vector.y, vector.z)))
+        from w3d.vecmath import Vector3, Quaternion
+        yaml.add_representer(Vector3, lambda dumper, vector: dumper.represent_scalar('Vector3', '%s, %s, %s' % (vector.x, vector.y, vector.z)))
         yaml.add_representer(Quaternion, lambda dumper, q: dumper.represent_scalar('Quaternion', '%s, %s, %s, %s' % (q.w, q.x, q.y, q.z)))
         print(yaml.dump(model))
         exit(0)
 
-    if options.threejs:
-        data = model.as_threejs(texture_paths=options.texture_path)
+    if options.glb:
+        with open(options.glb, "wb") as fw:
+            fw.write(model.as_gltf(texture_paths=options.texture_path, max_texture_size=options.texture_size, jobs=options.jobs,
+                texture_cache=texture_cache, atlas_size=options.atlas, atlas_threshold=options.atlas_threshold))
+
+    elif options.threejs:
         with open(options.threejs, "w") as fw:
-            fw.write(json.dumps(data, indent=2))
-            if options.debug:
-                print(json.dumps(data, indent=2))
+            model.write_threejs(fw, texture_paths=options.texture_path, **output)
+        logging.debug("written: %s (%s bytes)" % (options.threejs, os.path.getsize(options.threejs)))
 
     else:
-        print(json.dumps(model.as_threejs(), indent=2))
+        model.write_threejs(sys.stdout, **output)
 
 
 
@@ -0,0 +1,38 @@
+import os
+import sys
+import struct
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def chunk(chunkType, payload, container=False):
+    return struct.pack("<LL", chunkType, len(payload) | (0x80000000 if container else 0)) + payload
+
+def fixedString(value, size=16):
+    return value.encode().ljust(size, b"\0")
+
+def mesh(name, verts, faces):
+    header = struct.pack("<LL16s16s9L3f3f3ff", 0x40002, 0, fixedString(name), fixedString("CONT"), len(faces), len(verts),
+        1, 0, 0, 0, 0, 3, 1, -1, -1, -1, 1, 1, 1, 0, 0, 0, 1.7)
+    material = chunk(43, chunk(44, b"mat\0") + chunk(45, struct.pack("<L16B3f", 0, *range(16), 1.0, 1.0, 0.0)), True)
+    return chunk(0, chunk(31, header)
+        + chunk(2, b"".join(struct.pack("<3f", *vert) for vert in verts))
+        + chunk(3, b"".join(struct.pack("<3f", 0, 0, 1) for vert in verts))
+        + chunk(32, b"".join(struct.pack("<4L3ff", a, b, c, 13, 0, 0, 1, 0.5) for a, b, c in faces))
+        + chunk(40, struct.pack("<4L", 1, 1, 1, 0))
+        + chunk(41, bytes(range(16)))
+        + chunk(42, material, True)
+        + chunk(56, chunk(57, struct.pack("<L", 0)) + chunk(58, struct.pack("<L", 0)), True), True)
+
+@pytest.fixture
+def w3d_file(tmp_path):
+    """ a hierarchy with two pivots and two triangle meshes """
+    pivots = chunk(257, struct.pack("<L16sL3f", 0x40001, fixedString("SKL"), 2, 0, 0, 0)) + chunk(258,
+        struct.pack("<16sL3f3f4f", fixedString("ROOTTRANSFORM"), 0xFFFFFFFF, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1) +
+        struct.pack("<16sL3f3f4f", fixedString("MESH1"), 0, 1.1, 2.2, 3.3, 0, 0, 0, 0, 0, 0, 1))
+    triangle = [(0, 0, 0), (1, 0, 0), (0, 1, 0)]
+    path = tmp_path / "model.w3d"
+    path.write_bytes(chunk(256, pivots, True) + mesh("MESH1", triangle, [(0, 1, 2)]) + mesh("MESH2", triangle, [(0, 1, 2)]))
+    return str(path)
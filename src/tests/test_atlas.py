@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+from w3d.atlas import packTextures, PADDING
+
+
+def test_shelves():
+    atlases = packTextures({"a": (60, 40), "b": (60, 30), "c": (60, 20)}, 128)
+    assert len(atlases) == 1
+    atlas = atlases[0]
+    # sorted by height, two per shelf of 64 + 64 pixels with their border
+    assert atlas.regions == {
+        "a": (PADDING, PADDING, 60, 40),
+        "b": (64 + PADDING, PADDING, 60, 30),
+        "c": (PADDING, 44 + PADDING, 60, 20),
+    }
+    assert (atlas.width, atlas.height) == (128, 128)
+
+def test_transform():
+    atlas = packTextures({"a": (60, 40), "b": (60, 30)}, 128)[0]
+    assert (atlas.width, atlas.height) == (128, 64)
+    scale, offset = atlas.transform("b")
+    uv = offset + numpy.array([[0, 0], [1, 1]], numpy.float32) * scale
+    assert (uv * [128, 64]).tolist() == [[66, 2], [126, 32]]
+
+def test_padding():
+    atlas = packTextures({"a": (2, 2)}, 16)[0]
+    pixels = numpy.array([[[1], [2]], [[3], [4]]], numpy.uint8)
+    composed = atlas.compose({"a": pixels}, channels=1)[:, :, 0]
+    assert composed.shape == (8, 8)
+    assert composed[:6, :6].tolist() == [
+        [1, 1, 1, 2, 2, 2],
+        [1, 1, 1, 2, 2, 2],
+        [1, 1, 1, 2, 2, 2],
+        [3, 3, 3, 4, 4, 4],
+        [3, 3, 3, 4, 4, 4],
+        [3, 3, 3, 4, 4, 4],
+    ]
+
+def test_size_not_a_power_of_two():
+    atlases = packTextures({"a": (200, 100), "b": (80, 100), "c": (100, 40)}, 300)
+    assert len(atlases) == 1
+    # 288 pixels wide, a 512 atlas would go past the 300 asked for
+    assert (atlases[0].width, atlases[0].height) == (300, 256)
+
+def test_too_large():
+    with pytest.raises(ValueError):
+        packTextures({"a": (64, 64)}, 64)
@@ -0,0 +1,81 @@
+import struct
+
+import numpy
+import pytest
+
+from w3d import ImageWrapper
+from w3d.dds import DDS
+
+
+# solid colors of the mip levels, packed 5-6-5 and as decoded
+COLORS = [(0xF800, (248, 0, 0)), (0x07E0, (0, 252, 0)), (0x001F, (0, 0, 248)), (0xFFFF, (248, 252, 248))]
+
+def writeDDS(path, size, fourCC, levels):
+    """ a dds with levels mip levels, level i solid COLORS[i % 4] """
+    width, height = size
+    blockSize = 8 if fourCC == b"DXT1" else 16
+    data = []
+    for level in range(levels):
+        w, h = max(1, width >> level), max(1, height >> level)
+        color = COLORS[level % len(COLORS)][0]
+        block = struct.pack("<HHI", color, color, 0)
+        if blockSize == 16:     # alpha 0x80 everywhere
+            block = struct.pack("<BB6x", 0x80, 0x80) + block
+        data.append(block * (((w + 3) // 4) * ((h + 3) // 4)))
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | 0x80000
+    pixelFormat = struct.pack("<II4s5I", 32, 0x4, fourCC, 0, 0, 0, 0, 0)
+    caps = struct.pack("<II8x", 0x1000 | 0x400008, 0)
+    header = b"DDS " + struct.pack("<7I44x", 124, flags, height, width, len(data[0]), 0, levels) + pixelFormat + caps + b"\0" * 4
+    with open(path, "wb") as fp:
+        fp.write(header + b"".join(data))
+
+def test_dxt1_mip_levels(tmp_path):
+    path = str(tmp_path / "t.dds")
+    writeDDS(path, (32, 32), b"DXT1", 6)
+    im = DDS(path)
+    assert (im.mode, im.size) == ("RGB", (32, 32))
+    assert [ size for offset, size in im.mipLevels() ] == [(32, 32), (16, 16), (8, 8), (4, 4), (2, 2), (1, 1)]
+    im.draft(None, (16, 16))
+    assert im.size == (16, 16)
+    pixels = numpy.asarray(im)
+    assert pixels.shape == (16, 16, 3)
+    assert (pixels == COLORS[1][1]).all()
+
+def test_dxt5(tmp_path):
+    path = str(tmp_path / "t.dds")
+    writeDDS(path, (8, 4), b"DXT5", 4)
+    im = DDS(path)
+    assert im.mode == "RGBA"
+    im.draft(None, (4, 2))
+    assert im.size == (4, 2)
+    pixels = numpy.asarray(im)
+    assert pixels.shape == (2, 4, 4)
+    assert (pixels == COLORS[1][1] + (0x80,)).all()
+
+def writeUncompressedDDS(path, size, pixel):
+    """ a 32 bit X8R8G8B8 dds, every pixel the bgrx bytes pixel """
+    width, height = size
+    flags = 0x1 | 0x2 | 0x4 | 0x8 | 0x1000
+    pixelFormat = struct.pack("<II4s5I", 32, 0x40, b"\0" * 4, 32, 0xff0000, 0xff00, 0xff, 0)
+    caps = struct.pack("<II8x", 0x1000, 0)
+    header = b"DDS " + struct.pack("<7I44x", 124, flags, height, width, 4 * width, 0, 0) + pixelFormat + caps + b"\0" * 4
+    with open(path, "wb") as fp:
+        fp.write(header + pixel * (width * height))
+
+def test_uncompressed(tmp_path):
+    path = str(tmp_path / "t.dds")
+    writeUncompressedDDS(path, (8, 4), bytes([10, 20, 30, 0]))
+    im = DDS(path)
+    assert (im.mode, im.size) == ("RGB", (8, 4))
+    assert (numpy.asarray(im) == (30, 20, 10)).all()
+    with pytest.raises(ValueError):
+        im.mipLevels()
+
+def test_uncompressed_ktx_falls_back_to_jpeg(tmp_path):
+    writeUncompressedDDS(str(tmp_path / "t.dds"), (8, 4), bytes([10, 20, 30, 0]))
+    image = ImageWrapper("t.dds")
+    image.root, image.url = str(tmp_path), "t.dds"
+    image.export(".ktx", folder=str(tmp_path / "out"))
+    assert image.ready()
+    assert image.file == str(tmp_path / "out" / "t.dds.jpg")
+    assert not (tmp_path / "out" / "t.dds.ktx").exists()
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from w3d.dds.decoder import decodeDXT1, decodeDXT5
+from w3d.dds.encoder import encodeDXT1, encodeDXT5, QUALITIES
+
+
+def checker(color0, color1, size=8):
+    pixels = numpy.empty((size, size, len(color0)), numpy.uint8)
+    y, x = numpy.mgrid[:size, :size]
+    pixels[(x + y) % 2 == 0] = color0
+    pixels[(x + y) % 2 == 1] = color1
+    return pixels
+
+def gradient(channels):
+    y, x = numpy.mgrid[:32, :32]
+    return numpy.stack([x * 8, y * 8, (x + y) * 4, 255 - x * 4][:channels], axis=-1).astype(numpy.uint8)
+
+def roundTrip(pixels, quality):
+    height, width, channels = pixels.shape
+    if channels == 3:
+        decoded = decodeDXT1(encodeDXT1(pixels, quality), width, height)
+    else:
+        decoded = decodeDXT5(encodeDXT5(pixels, quality), width, height)
+    return numpy.asarray(decoded).reshape(height, width, -1)[:, :, :channels]
+
+# two colors per block fit the 5-6-5 endpoints, off by at most one 5 bit step
+@pytest.mark.parametrize("quality", QUALITIES)
+@pytest.mark.parametrize("pixels, bound", [
+    (checker((255, 0, 0), (0, 255, 0)), 8),
+    (checker((255, 0, 0), (0, 0, 255)), 8),
+    (checker((0, 255, 0), (0, 0, 255)), 8),
+    (checker((200, 40, 90), (200, 40, 90)), 8),
+    (gradient(3), 16),
+])
+def test_dxt1_round_trip(pixels, bound, quality):
+    assert numpy.abs(roundTrip(pixels, quality).astype(int) - pixels).max() <= bound
+
+@pytest.mark.parametrize("quality", QUALITIES)
+def test_dxt5_round_trip(quality):
+    for pixels, bound in ((checker((255, 0, 0, 255), (0, 255, 0, 0)), 8), (gradient(4), 16)):
+        assert numpy.abs(roundTrip(pixels, quality).astype(int) - pixels).max() <= bound
@@ -0,0 +1,29 @@
+import io
+
+import numpy
+
+from w3d.jsonwriter import JsonWriter, Float32List
+
+
+def dumps(value, **options):
+    fp = io.StringIO()
+    JsonWriter(fp, **options).write(value)
+    return fp.getvalue()
+
+def test_compact_float32():
+    verts = numpy.array([0.3, 1.0, 0.1], numpy.float32)
+    assert dumps(verts, compact=True) == "[0.3,1,0.1]"
+    assert dumps(Float32List(verts.tolist()), compact=True) == "[0.3,1,0.1]"
+
+def test_compact_doubles():
+    assert dumps([0.1 + 0.2, 1e-300], compact=True) == "[0.30000000000000004,1e-300]"
+    assert dumps(333333333330000000000000000.0, compact=True) == "3.3333333333e+26"
+
+def test_mixed_ints():
+    assert dumps([2 ** 53 + 1, 0.5], compact=True) == "[9007199254740993,0.5]"
+    assert dumps({"a": [16777217, 0.25]}, compact=True, precision={"a": 1}) == '{"a":[16777217,0.2]}'
+
+def test_float32_scalars():
+    from w3d.jsonwriter import Float32
+    assert dumps({"a": Float32(numpy.float32(1.7)), "b": numpy.float32(0.3)}, compact=True) == '{"a":1.7,"b":0.3}'
+    assert dumps(Float32(numpy.float32(1.7))) == "1.7000000476837158"
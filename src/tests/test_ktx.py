@@ -0,0 +1,42 @@
+import io
+from struct import unpack
+
+from w3d.dds.ktx import saveKTX, KTX_IDENTIFIER
+
+
+class FakeDDS(object):
+    """ the parts of a DXT1 DDS image saveKTX uses """
+    fourCC = b"DXT1"
+    mode = "RGB"
+
+    def __init__(self, size, count):
+        self.levels = []
+        offset = 128
+        width, height = size
+        for level in range(count):
+            self.levels.append((offset, (width, height)))
+            offset += self.mipLevelSize((width, height))
+            width, height = max(1, width // 2), max(1, height // 2)
+        self.fp = io.BytesIO(b"\0" * offset)
+
+    def mipLevels(self):
+        return self.levels
+
+    def mipLevelSize(self, size):
+        return max(1, (size[0] + 3) // 4) * max(1, (size[1] + 3) // 4) * 8
+
+def header(data):
+    assert data[:12] == KTX_IDENTIFIER
+    values = unpack("<13I", data[12:64])
+    return values[6], values[7], values[11]     # width, height, numberOfMipmapLevels
+
+def test_full_chain():
+    fp = io.BytesIO()
+    saveKTX(FakeDDS((16, 8), 5), fp, maxSize=8)
+    assert header(fp.getvalue()) == (8, 4, 4)
+
+def test_truncated_chain():
+    fp = io.BytesIO()
+    saveKTX(FakeDDS((16, 8), 3), fp, maxSize=8)
+    assert header(fp.getvalue()) == (8, 4, 1)
+    assert len(fp.getvalue()) == 64 + 4 + 2 * 1 * 8
@@ -0,0 +1,32 @@
+import pytest
+
+from w3d import W3DModel
+
+
+def test_lazy_access(w3d_file):
+    with W3DModel.from_file(w3d_file) as model:
+        assert model.mesh_names() == ["MESH1", "MESH2"]
+        assert model.mesh("MESH2").verts.shape == (3, 3)
+        assert [ pivot.name for pivot in model.hierarchy.pivots ] == ["ROOTTRANSFORM", "MESH1"]
+
+def test_closed(w3d_file):
+    model = W3DModel.from_file(w3d_file)
+    model.close()
+    with pytest.raises(ValueError, match="closed"):
+        model.mesh_names()
+    with pytest.raises(ValueError, match="closed"):
+        model.hierarchy
+    model.close()
+
+def test_compact_threejs(w3d_file):
+    import io
+    import json
+    fp = io.StringIO()
+    with W3DModel.from_file(w3d_file) as model:
+        model.write_threejs(fp, buffer_geometry=True, compact=True)
+    text = fp.getvalue()
+    assert '"matrix":[1,0,0,0,0,1,0,0,0,0,1,0,1.1,2.2,3.3,1]' in text
+    assert '"radius":1.7}' in text
+    assert '"opacity":1,' in text
+    data = json.loads(text)
+    assert data["geometries"][0]["data"]["boundingSphere"]["radius"] == 1.7
@@ -0,0 +1,25 @@
+import struct
+
+from w3d.reader import iter_chunks
+
+
+def test_iter_chunks(w3d_file):
+    paths = [ path for path, offset, size, payload in iter_chunks(w3d_file) ]
+    assert paths[:3] == [(256,), (256, 257), (256, 258)]
+    assert (0, 42, 43, 45) in paths
+    meshes = [ mesh.header.meshName for path, offset, size, mesh in iter_chunks(w3d_file, decode={0}) if path == (0,) ]
+    assert meshes == ["MESH1", "MESH2"]
+
+def test_view_outlives_iteration(w3d_file):
+    views = [ payload.view() for path, offset, size, payload in iter_chunks(w3d_file) if path == (0, 2) ]
+    assert len(views) == 2
+    assert struct.unpack_from("<3f", views[0], 12) == (1.0, 0.0, 0.0)
+
+def test_break_early(w3d_file):
+    chunks = iter_chunks(w3d_file)
+    for path, offset, size, payload in chunks:
+        if path == (0, 31):
+            view = payload.view()
+            break
+    chunks.close()
+    assert view[:4] == struct.pack("<L", 0x40002)
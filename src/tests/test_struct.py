@@ -0,0 +1,21 @@
+import pytest
+
+from w3d import struct_w3d
+
+
+def test_fresh_defaults():
+    a, b = struct_w3d.Mesh(), struct_w3d.Mesh()
+    assert a.header is not b.header
+    assert a.header.minCorner is not b.header.minCorner
+    assert a.matlPass.txStage.txIds is not b.matlPass.txStage.txIds
+    assert a.verts is not b.verts
+    assert a.header.vertChannelCount == 3
+
+def test_arguments():
+    assert struct_w3d.Version(5, 1).minor == 1
+    color = struct_w3d.RGBA(1, 2, a=4)
+    assert (color.r, color.g, color.b, color.a) == (1, 2, 0, 4)
+    with pytest.raises(TypeError):
+        struct_w3d.RGBA(q=1)
+    with pytest.raises(AttributeError):
+        color.q = 1
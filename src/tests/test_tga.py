@@ -0,0 +1,44 @@
+import io
+
+import numpy
+import pytest
+from PIL import Image
+
+from w3d.tga import TGA
+
+
+def sample(mode, width=37, height=23):
+    """ noise on top, long runs at the bottom so rle has both kinds of packets """
+    rng = numpy.random.default_rng(1)
+    bands = 3 if mode == "P" else len(mode)
+    pixels = rng.integers(0, 4, (height, width, bands), dtype=numpy.uint8) * 60
+    pixels[:height // 2] = rng.integers(0, 256, (height // 2, width, bands), dtype=numpy.uint8)
+    if mode == "P":
+        return Image.fromarray(pixels, "RGB").quantize(50)
+    return Image.fromarray(pixels[:, :, 0] if mode == "L" else pixels, mode)
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "P"])
+@pytest.mark.parametrize("compression", [None, "tga_rle"])
+@pytest.mark.parametrize("orientation", [-1, 1])
+def test_matches_pillow(mode, compression, orientation):
+    source = sample(mode)
+    fp = io.BytesIO()
+    source.save(fp, "TGA", compression=compression, orientation=orientation)
+    fp.seek(0)
+    im = TGA(fp)
+    expected = source.convert("RGB") if mode == "P" else source
+    assert (im.mode, im.size) == (expected.mode, expected.size)
+    assert (numpy.asarray(im) == numpy.asarray(expected)).all()
+
+def test_16_bit_alpha():
+    pixels = numpy.array([0x7c00, 0x83e0, 0x801f, 0x0000], numpy.uint16)
+    header = bytes([0, 0, 2]) + b"\0" * 9 + (2).to_bytes(2, "little") + (2).to_bytes(2, "little") + bytes([16, 0x21])
+    im = TGA(io.BytesIO(header + pixels.tobytes()))
+    assert im.mode == "RGBA"
+    assert numpy.asarray(im).reshape(-1, 4).tolist() == [
+        [255, 0, 0, 0], [0, 255, 0, 255], [0, 0, 255, 255], [0, 0, 0, 0]]
+
+def test_color_map_without_map():
+    header = bytes([0, 0, 1]) + b"\0" * 9 + (1).to_bytes(2, "little") + (1).to_bytes(2, "little") + bytes([8, 0x20])
+    with pytest.raises(ValueError):
+        TGA(io.BytesIO(header + b"\0"))
@@ -0,0 +1,16 @@
+from w3d.vecmath import Vector3, Quaternion, Matrix
+
+
+def test_equal():
+    assert Vector3((1, 2, 3)) == (1, 2, 3)
+    assert Vector3((1, 2, 3)) != Vector3((1, 2, 4))
+    assert Quaternion() == [1, 0, 0, 0]
+    assert Matrix([[1, 0], [0, 1]]) == ((1, 0), (0, 1))
+
+def test_compare_with_others():
+    for other in (None, 5, "abc", (1, 2), Quaternion()):
+        assert not Vector3() == other
+        assert Vector3() != other
+    assert Quaternion() != None
+    assert Matrix([[1, 0], [0, 1]]) != None
+    assert Matrix([[1, 0], [0, 1]]) != [1, 2]
@@ -1,101 +1,205 @@
+import numpy
+
 from . import struct_w3d
-from .reader import ReadLong, GetChunkSize, ReadMesh, ReadHierarchy, ReadAnimation, ReadCompressedAnimation, ReadHLod, ReadBox
+from .reader import ChunkReader, ScanChunks, ReadMesh, FILE_CHUNKS, Record
+from .reader import ReadString, ReadMeshHeader, ReadMeshMaterialSetInfo, ReadHierarchyHeader, ReadAnimationHeader, \
+    ReadCompressedAnimationHeader, ReadHLodHeader, ReadHLodArrayHeader, ReadHLodSubObject
 
 import logging
 logger = logging.getLogger("W3DModel.w3d")
 
-from mathutils import Vector
+from .vecmath import Vector3
+from .jsonwriter import Float32, Float32List
 def t(vec):
     return vec
-    return Vector((vec.z, vec.y, vec.x))
+    return Vector3((vec.z, vec.y, vec.x))
 
 
 
 class W3DModel(object):
+    """
+    A w3d file backed by its chunk index. Meshes, hierarchy, animations, hlod
+    and box are decoded on first access only.
+    """
+
+    # top level chunk type -> reader, meshes (0) are handled separately
+    _CHUNKS = dict((chunkType, field.decode) for chunkType, field in FILE_CHUNKS.items() if chunkType != 0)
 
-    def __init__(self, meshes, hierarchy, animation, compressed_animation, hlod, box):
-        self.meshes = meshes
-        self.hierarchy = hierarchy
-        self.animation = animation
-        self.compressed_animation = compressed_animation
-        self.hlod = hlod
-        self.box = box
+    def __init__(self, file, chunks):
+        self._file = file
+        self._chunks = chunks
+        self._loaded = {}       # chunk type -> decoded struct
+        self._meshes = {}       # Chunk -> Mesh
+        self._mesh_index = None # meshName -> Chunk
 
     @classmethod
     def from_file(Cls, path):
+        return Cls.from_buffer(ChunkReader.from_file(path))
 
-        with open(path, "rb") as file:
-            file.seek(0,2)
-            filesize = file.tell()
-            file.seek(0,0)
-            Meshes = []
-            Box = struct_w3d.Box()
-            Textures = []
-            Hierarchy = struct_w3d.Hierarchy()
-            Animation = struct_w3d.Animation()
-            CompressedAnimation = struct_w3d.CompressedAnimation()
-            HLod = struct_w3d.HLod()
-            amtName = ""
-
-            while file.tell() < filesize:
-                Chunktype = ReadLong(file)
-                Chunksize = GetChunkSize(ReadLong(file))
-                #print(Chunksize)
-                chunkEnd = file.tell() + Chunksize
-                if Chunktype == 0:
-                    m = ReadMesh(file, chunkEnd)
-                    Meshes.append(m)
-                    file.seek(chunkEnd,0)
-
-                elif Chunktype == 256:
-                    Hierarchy = ReadHierarchy(file, chunkEnd)
-                    file.seek(chunkEnd,0)
-
-                elif Chunktype == 512:
-                    Animation = ReadAnimation(file, chunkEnd)
-                    file.seek(chunkEnd,0)
-
-                elif Chunktype == 640:
-                    CompressedAnimation = ReadCompressedAnimation(file, chunkEnd)
-                    file.seek(chunkEnd,0)
-
-                elif Chunktype == 1792:
-                    HLod = ReadHLod(file, chunkEnd)
-                    file.seek(chunkEnd,0)
-
-                elif Chunktype == 1856:
-                    Box = ReadBox(file)
-                    file.seek(chunkEnd,0)
-
-                else:
-                    logger.error("unknown chunktype in File: %s" % Chunktype)
-                    file.seek(Chunksize,1)
-
-        return Cls(Meshes, Hierarchy, Animation, CompressedAnimation, HLod, Box)
-
-
-    def as_threejs(self, texture_paths=[]):
-        logger.debug("building threejs object...")
-
-        if not self.hlod.header.modelName == self.hlod.header.HTreeName:
-            raise NotImplementedError("hlod.header.modelName != hlod.header.HTreeName")
-
-        mesh_index = { m.header.meshName: m for m in self.meshes }
-
-        object_root = self.createHierarchyWrapper(self.hierarchy.pivots, self.meshes)
-
-        materials = []
-        textures = []
-
-        logger.info("Threejs object built")
-
-        _object = object_root.to_json()
-
-        for image in ImageWrapper.wrappings():
-            image.fix_file(texture_paths=texture_paths)
+    @classmethod
+    def from_buffer(Cls, data):
+        file = data if isinstance(data, ChunkReader) else ChunkReader(data)
+        file.seek(0)
+        chunks = ScanChunks(file, len(file))
+        for chunk in chunks:
+            if chunk.type not in FILE_CHUNKS:
+                logger.error("unknown chunktype in File: %s" % chunk.type)
+        return Cls(file, chunks)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _decode(self, chunk, reader):
+        if self._file is None:
+            raise ValueError("W3DModel is closed")
+        self._file.seek(chunk.offset)
+        return reader(self._file, chunk.end)
+
+    def _load(self, chunkType, default):
+        try:
+            return self._loaded[chunkType]
+        except KeyError:
+            pass
+        # the last chunk of a type wins, as it did when decoding everything
+        chunks = [ chunk for chunk in self._chunks if chunk.type == chunkType ]
+        value = self._loaded[chunkType] = self._decode(chunks[-1], self._CHUNKS[chunkType]) if chunks else default()
+        return value
+
+    hierarchy = property(lambda self: self._load(256, struct_w3d.Hierarchy))
+    animation = property(lambda self: self._load(512, struct_w3d.Animation))
+    compressed_animation = property(lambda self: self._load(640, struct_w3d.CompressedAnimation))
+    hlod = property(lambda self: self._load(1792, struct_w3d.HLod))
+    box = property(lambda self: self._load(1856, struct_w3d.Box))
+
+    @property
+    def meshes(self):
+        return [ self._decode_mesh(chunk) for chunk in self._chunks if chunk.type == 0 ]
+
+    def mesh_names(self):
+        """ mesh names, only the mesh headers get decoded """
+        if self._mesh_index is None:
+            self._mesh_index = {}
+            for chunk in self._chunks:
+                if chunk.type == 0:
+                    header = chunk.find(31)
+                    if header is not None:
+                        self._mesh_index[self._decode(header, Record(ReadMeshHeader)).meshName] = chunk
+        return list(self._mesh_index)
+
+    def mesh(self, name):
+        self.mesh_names()
+        return self._decode_mesh(self._mesh_index[name])
+
+    def _decode_mesh(self, chunk):
+        try:
+            return self._meshes[chunk]
+        except KeyError:
+            mesh = self._meshes[chunk] = self._decode(chunk, ReadMesh)
+            return mesh
 
-        for image in ImageWrapper.wrappings():
-            image.export(ext=".jpg", folder="textures")
+    @classmethod
+    def inspect(Cls, path):
+        """
+        Summary of a w3d file built from header chunks only (31, 40, 50, 257,
+        513, 641, 1793, 1795, 1796), vertex and face payloads are never read.
+        """
+        with ChunkReader.from_file(path) as file:
+            def read(chunk, reader):
+                file.seek(chunk.offset)
+                return reader(file)
+
+            info = {
+                "file": path,
+                "meshes": [],
+                "hierarchy": None,
+                "animations": [],
+                "hlod": None,
+            }
+            for chunk in ScanChunks(file, len(file)):
+                if chunk.type == 0:
+                    mesh = {}
+                    header = chunk.find(31)
+                    if header is not None:
+                        header = read(header, ReadMeshHeader)
+                        mesh.update({
+                            "name": header.meshName,
+                            "container": header.containerName,
+                            "faceCount": header.faceCount,
+                            "vertCount": header.vertCount,
+                            "minCorner": list(header.minCorner),
+                            "maxCorner": list(header.maxCorner),
+                            "sphCenter": list(header.sphCenter),
+                            "sphRadius": header.sphRadius,
+                        })
+                    matInfo = chunk.find(40)
+                    if matInfo is not None:
+                        matInfo = read(matInfo, ReadMeshMaterialSetInfo)
+                        mesh.update({
+                            "passCount": matInfo.passCount,
+                            "vertMatlCount": matInfo.vertMatlCount,
+                            "shaderCount": matInfo.shaderCount,
+                            "textureCount": matInfo.textureCount,
+                        })
+                    mesh["textures"] = [ read(name, ReadString)
+                                         for textures in chunk.findall(48)
+                                         for texture in textures.findall(49)
+                                         for name in texture.findall(50) ]
+                    info["meshes"].append(mesh)
+
+                elif chunk.type == 256:
+                    for header in chunk.findall(257):
+                        header = read(header, ReadHierarchyHeader)
+                        info["hierarchy"] = {
+                            "name": header.name,
+                            "pivotCount": header.pivotCount,
+                        }
+
+                elif chunk.type in (512, 640):
+                    for header in chunk.findall(513) + chunk.findall(641):
+                        header = read(header, ReadAnimationHeader if header.type == 513 else ReadCompressedAnimationHeader)
+                        info["animations"].append({
+                            "name": header.name,
+                            "hieraName": header.hieraName,
+                            "numFrames": header.numFrames,
+                            "frameRate": header.frameRate,
+                            "compressed": chunk.type == 640,
+                        })
+
+                elif chunk.type == 1792:
+                    hlod = info["hlod"] = {"lods": []}
+                    for header in chunk.findall(1793):
+                        header = read(header, ReadHLodHeader)
+                        hlod.update({
+                            "modelName": header.modelName,
+                            "HTreeName": header.HTreeName,
+                            "lodCount": header.lodCount,
+                        })
+                    for lodArray in chunk.findall(1794):
+                        lod = {"subObjects": []}
+                        for header in lodArray.findall(1795):
+                            header = read(header, ReadHLodArrayHeader)
+                            lod["modelCount"] = header.modelCount
+                            lod["maxScreenSize"] = header.maxScreenSize
+                        for subObject in lodArray.findall(1796):
+                            subObject = read(subObject, ReadHLodSubObject)
+                            lod["subObjects"].append({"name": subObject.name, "boneIndex": subObject.boneIndex})
+                        hlod["lods"].append(lod)
+
+            info["pivotCount"] = info["hierarchy"]["pivotCount"] if info["hierarchy"] else 0
+            return info
+
+    def as_threejs(self, texture_paths=[], buffer_geometry=False, max_texture_size=None, compressed_textures=False, jobs=1, texture_cache=None,
+            atlas_size=None, atlas_threshold=256):
+        _object = self._prepare_threejs(texture_paths, max_texture_size, compressed_textures, jobs, texture_cache,
+            atlas_size, atlas_threshold)
 
         data = {
             "images": [ image.to_json() for image in ImageWrapper.wrappings() if image.ready() ],
@@ -103,7 +207,7 @@ class W3DModel(object):
             "object": _object,
             "textures": [ texture.to_json() for texture in TextureWrapper.wrappings() if texture.ready() ],
             "metadata": {},
-            "geometries": [ mesh.to_json() for mesh in MeshWrapper.wrappings() ],
+            "geometries": [ mesh.to_buffer_json() if buffer_geometry else mesh.to_json() for mesh in MeshWrapper.wrappings() ],
             "materials": [ material.to_json() for material in MaterialWrapper.wrappings() ]
         }
 
@@ -145,6 +249,186 @@ class W3DModel(object):
 
         return data
 
+    # attribute -> keys holding its floats, in Geometry and BufferGeometry data
+    THREEJS_ATTRIBUTES = {
+        "position": ("vertices", "position"),
+        "normal": ("normals", "normal"),
+        "uv": ("uvs", "uv"),
+        "matrix": ("matrix",),
+    }
+
+    def write_threejs(self, fp, texture_paths=[], buffer_geometry=False, indent=None, compact=False, precision={}, max_texture_size=None, compressed_textures=False, jobs=1,
+            texture_cache=None, atlas_size=None, atlas_threshold=256):
+        """
+        Stream the threejs object to fp. Geometries go last and one at a time,
+        so only the mesh currently written exists as json data.
+
+        compact drops whitespace and prints floats in their shortest form, precision maps attributes (position, normal, uv, matrix) to the
+        number of decimals written, max_texture_size limits the exported images.
+        compressed_textures exports dds textures as KTX files of their DXT blocks,
+        jobs is the number of processes converting textures, texture_cache a
+        TextureCache of earlier conversions. atlas_size packs textures up to
+        atlas_threshold pixels into atlases of that size.
+        """
+        from .jsonwriter import JsonWriter
+        _object = self._prepare_threejs(texture_paths, max_texture_size, compressed_textures, jobs, texture_cache,
+            atlas_size, atlas_threshold)
+
+        digits = { key: precision[name] for name, keys in self.THREEJS_ATTRIBUTES.items() if name in precision for key in keys }
+        writer = JsonWriter(fp, indent=indent, compact=compact, precision=digits)
+        writer.begin_object()
+        writer.write([ image.to_json() for image in ImageWrapper.wrappings() if image.ready() ], "images")
+        writer.write([], "animations")
+        writer.write(_object, "object")
+        writer.write([ texture.to_json() for texture in TextureWrapper.wrappings() if texture.ready() ], "textures")
+        writer.write({}, "metadata")
+        writer.write([ material.to_json() for material in MaterialWrapper.wrappings() ], "materials")
+        writer.begin_array("geometries")
+        for mesh in MeshWrapper.wrappings():
+            writer.write(mesh.to_buffer_json() if buffer_geometry else mesh.to_json())
+        writer.end()
+        writer.end()
+
+    def _prepare_threejs(self, texture_paths, max_texture_size=None, compressed_textures=False, jobs=1, texture_cache=None,
+            atlas_size=None, atlas_threshold=256):
+        logger.debug("building threejs object...")
+
+        if not self.hlod.header.modelName == self.hlod.header.HTreeName:
+            raise NotImplementedError("hlod.header.modelName != hlod.header.HTreeName")
+
+        object_root = self.createHierarchyWrapper(self.hierarchy.pivots, self.meshes)
+        meshes = self.wrap_materials(object_root)
+
+        self.export_images(texture_paths=texture_paths, max_size=max_texture_size,
+            ext=".ktx" if compressed_textures else ".jpg", jobs=jobs, cache=texture_cache)
+        if atlas_size:
+            self.pack_textures(meshes, object_root.name, atlas_size, atlas_threshold)
+
+        _object = object_root.to_json()
+
+        logger.info("Threejs object built")
+
+        return _object
+
+    def as_gltf(self, texture_paths=[], max_texture_size=None, jobs=1, texture_cache=None, atlas_size=None, atlas_threshold=256):
+        """ binary glTF (.glb) of the pivot hierarchy, meshes, materials and embedded textures """
+        from .gltf import GltfBuilder
+        logger.debug("building gltf object...")
+
+        object_root = self.createHierarchyWrapper(self.hierarchy.pivots, self.meshes)
+        meshes = self.wrap_materials(object_root)
+
+        self.export_images(texture_paths=texture_paths, max_size=max_texture_size, jobs=jobs, cache=texture_cache)
+        if atlas_size:
+            self.pack_textures(meshes, object_root.name, atlas_size, atlas_threshold)
+
+        builder = GltfBuilder()
+        builder.add_root(object_root.to_gltf(builder))
+        logger.info("gltf object built")
+        return builder.to_glb()
+
+    def wrap_materials(self, object_root):
+        """ materials of all meshes below object_root, they decide which images are needed """
+        meshes = []
+        pivots = [object_root]
+        for pivot in pivots:
+            pivots.extend(pivot.children)
+            if pivot.mesh and pivot.mesh not in meshes:
+                wrapMaterial(pivot.mesh)
+                meshes.append(pivot.mesh)
+        return meshes
+
+    def pack_textures(self, meshes, name, size=2048, threshold=256, folder="textures"):
+        """
+        Pack the exported images of at most threshold pixels into atlases of
+        size x size, move the uvs of their meshes into the atlas and merge
+        materials that only differed by texture. Images of meshes with uvs
+        outside 0..1 (tiling) and KTX files are left alone, as are images too
+        large for an atlas of this size.
+        """
+        import os.path
+        from PIL import Image
+        from .atlas import packTextures, PADDING
+
+        threshold = min(threshold, size - 2 * PADDING)
+
+        users = {}
+        excluded = set()
+        for mesh in meshes:
+            texture = mesh.material.texture
+            if texture is None:
+                continue
+            image = texture.image
+            users.setdefault(image, []).append(mesh)
+            txCoords = mesh.txCoords()
+            if not image.ready() or not len(txCoords) or txCoords.min() < 0 or txCoords.max() > 1 \
+                    or os.path.splitext(image.file)[1].lower() not in (".jpg", ".png"):
+                excluded.add(image)
+
+        pixels = {}
+        for image in users:
+            if image in excluded:
+                continue
+            with Image.open(image.file) as im:
+                if max(im.size) <= threshold:
+                    pixels[image] = im.copy()
+        if len(pixels) < 2:
+            return
+
+        atlases = packTextures({ image: im.size for image, im in pixels.items() }, size)
+        for i, atlas in enumerate(atlases):
+            if len(atlas.regions) < 2:
+                continue
+            alpha = any(pixels[image].mode in ("RGBA", "LA") for image in atlas.regions)
+            mode = "RGBA" if alpha else "RGB"
+            url = os.path.join(folder, "%s-atlas%d%s" % (name, i, ".png" if alpha else ".jpg"))
+            data = atlas.compose({ image: numpy.asarray(pixels[image].convert(mode)) for image in atlas.regions }, len(mode))
+            Image.fromarray(data, mode).save(url, **({} if alpha else {"quality": JPEG_QUALITY}))
+            logger.info("atlas: %s (%d textures, %dx%d)" % (url, len(atlas.regions), atlas.width, atlas.height))
+
+            texture = TextureWrapper.wrap(os.path.basename(url))
+            texture.image.root = folder
+            texture.image.url = texture.image.file = url
+
+            for image in atlas.regions:
+                transform = atlas.transform(image)
+                for mesh in users[image]:
+                    mesh.uvTransform = transform
+                    names = [ matl.vmName for matl in mesh.vertMatls ] + [ texture.name ]
+                    material = MaterialWrapper.wrap("-".join(names))
+                    material.texture = texture
+                    material.vertMatl = mesh.material.vertMatl
+                    mesh.material = material
+                # packed images and their textures aren't exported on their own anymore
+                del ImageWrapper._cache[image.name]
+                del TextureWrapper._cache[image.name]
+
+        used = set(mesh.material for mesh in meshes)
+        for material in list(MaterialWrapper.wrappings()):
+            if material not in used and material.texture is not None and material.texture.name not in TextureWrapper._cache:
+                del MaterialWrapper._cache[material.name]
+
+    def export_images(self, texture_paths=[], max_size=None, ext=".jpg", jobs=1, cache=None):
+        """
+        Resolve and convert all images, with jobs > 1 in a process pool. A
+        missing texture raises FileNotFoundError, conversion errors are kept
+        in image.error either way.
+        """
+        images = list(ImageWrapper.wrappings())
+        if jobs > 1 and len(images) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [ pool.submit(exportImage, image.name, texture_paths, ext, "textures", max_size, cache) for image in images ]
+                for image, future in zip(images, futures):
+                    image.root, image.url, image.file, image.error = future.result()
+            return
+
+        for image in images:
+            image.fix_file(texture_paths=texture_paths)
+
+        for image in images:
+            image.export(ext=ext, folder="textures", max_size=max_size, cache=cache)
+
     def createHierarchyWrapper(self, pivots, meshes):
         # convert to wrappers
         pivots = [ PivotWrapper.wrap(pivot) for pivot in pivots ]
@@ -168,7 +452,7 @@ class W3DModel(object):
         scene = PivotWrapper(None)
         scene.mesh = list(meshIndex.values())[0]
         scene.name = scene.mesh.header.meshName
-        scene.position = struct_w3d.Vector((0, 0, 0))
+        scene.position = struct_w3d.Vector3((0, 0, 0))
         scene.rotation = struct_w3d.Quaternion((0, 0, 0, 0))
         return scene
 
@@ -200,46 +484,42 @@ class Wrapper(object):
             if isinstance(wrapped, Cls):
                 yield wrapped
 
-class Face(object):
-    def __init__(self, a, b, c, normal=None):
-        self.a = a
-        self.b = b
-        self.c = c
-        self.normal = normal
-        self.uvs = []
-    def __repr__(self):
-        return '<Face %s, %s, %s, normal=%s>' % (self.a, self.b, self.c, self.normal)
-    def to_tuple(self, normals, uvs):
-        type = 0
-        normal = uv = material = ()
-        if self.normal:
-            type += 1 << 4
-            normal = (normals.index(self.normal),)
-        if self.uvs:
-            assert len(self.uvs) == 1
-            type += 1 << 3
-            uv = tuple( uvs.index(vec) for vec in self.uvs[0] )
-            type += 1 << 1
-            material = (0,)
-
-        return (type,) + (self.a, self.b, self.c) + material + uv + normal
+def unique_rows(array):
+    """
+    Unique rows of a 2d array plus, for every input row, the index of its
+    unique row. Replaces list.index() lookups, which made exports quadratic.
+    """
+    if not len(array):
+        return array, numpy.zeros(0, numpy.int64)
+    values, inverse = numpy.unique(array, axis=0, return_inverse=True)
+    return values, inverse.reshape(-1)
+
+# three.js Geometry face type bits
+FACE_MATERIAL = 1 << 1
+FACE_VERTEX_UV = 1 << 3
+FACE_NORMAL = 1 << 4
 
 class MeshWrapper(Wrapper):
     def __init__(self, *args, **kwargs):
         super(MeshWrapper, self).__init__(*args, **kwargs)
         self.materials = []
+        self.material = None
+        self.uvTransform = None  # (scale, offset) into a texture atlas
 
     def uuid(self):
         return "DDA9AE26-MESH-UUID-%s" % self.header.meshName
 
-    def to_json(self):
+    def txCoords(self):
+        """ per vertex uvs of the first texture stage as (N, 2) float32 """
+        txCoords = numpy.asarray(self.matlPass.txStage.txCoords, dtype=numpy.float32).reshape(-1, 2)
+        if self.uvTransform is not None:
+            scale, offset = self.uvTransform
+            txCoords = txCoords * scale + offset
+        return txCoords
 
-        faces = []
-        normals = []
-        uvs = []
-        for f in self.faces:
-            faces.append(Face(*f.vertIds, f.normal))
-            normals.append(f.normal)
+    def to_json(self):
+        vertIds = self.faces["vertIds"].astype(numpy.int64)
+        normals, normalIds = unique_rows(self.faces["normal"])
 
         assert len(self.matlPass.vmIds) >= 1, self.header.meshName
 
@@ -247,15 +527,18 @@ class MeshWrapper(Wrapper):
             logger.warn("%s: Multitexture isn't supported yet, just using first" % self.header.meshName)
 #        assert self.matlPass.vmIds == [0], self.header.meshName  # just one material is currently supported
 
-        if len(self.matlPass.txStage.txCoords)>0:
-            for face in faces:
-                uv = [
-                    self.matlPass.txStage.txCoords[face.a],  # Tuple
-                    self.matlPass.txStage.txCoords[face.b],
-                    self.matlPass.txStage.txCoords[face.c]
-                ]
-                face.uvs.append(uv)
-                uvs.extend(uv)
+        # face layout: type, a, b, c [, material, uv a, uv b, uv c], normal
+        type = FACE_NORMAL
+        columns = [vertIds]
+        uvs = ()
+        txCoords = self.txCoords()
+        if len(txCoords):
+            # uvs are per vertex, so dedup them once and look faces up by vertex id
+            uvs, uvIds = unique_rows(txCoords)
+            type |= FACE_VERTEX_UV | FACE_MATERIAL
+            columns += [numpy.zeros((len(vertIds), 1), numpy.int64), uvIds[vertIds]]
+        columns.append(normalIds.reshape(-1, 1))
+        faces = numpy.column_stack([numpy.full((len(vertIds), 1), type, numpy.int64)] + columns)
 
         data = {
             "uuid": self.uuid(),
@@ -272,17 +555,88 @@ class MeshWrapper(Wrapper):
 #                    "version": 3,
 #                    "materials": 1
                 },
-                "faces": [ item for face in faces for item in face.to_tuple(normals, uvs)],
-                "normals": [ item for n in normals for item in t(n).to_tuple() ],
-                "vertices": [ item for n in self.verts for item in t(n).to_tuple() ],
+                "faces": faces.ravel().tolist(),
+                "normals": Float32List(normals.ravel().tolist()),
+                "vertices": Float32List(self.verts.ravel().tolist()),
             },
         }
-        if uvs:
+        if len(uvs):
             data["data"]["metadata"]["uvs"] = 1
-            data["data"]["uvs"] = [ [ x for vec in uvs for x in vec ] ]
+            data["data"]["uvs"] = [ Float32List(uvs.ravel().tolist()) ]
 
         return data
 
+    def to_buffer_json(self):
+        """
+        BufferGeometry with flat position/normal/uv attributes and an index,
+        ready for the GPU without any per-face work on the client.
+        """
+        vertCount = len(self.verts)
+
+        def attribute(array, itemSize):
+            return {
+                "itemSize": itemSize,
+                "type": "Float32Array",
+                "array": Float32List(array.ravel().tolist()),
+                "normalized": False,
+            }
+
+        attributes = {
+            "position": attribute(self.verts, 3),
+        }
+        # w3d stores normals and uvs per vertex, so they index like the positions
+        if len(self.normals) == vertCount:
+            attributes["normal"] = attribute(self.normals, 3)
+        txCoords = self.txCoords()
+        if len(txCoords) == vertCount and vertCount:
+            attributes["uv"] = attribute(txCoords, 2)
+
+        return {
+            "uuid": self.uuid(),
+            "type": "BufferGeometry",
+            "data": {
+                "attributes": attributes,
+                "index": {
+                    "type": "Uint16Array" if vertCount <= 0xFFFF else "Uint32Array",
+                    "array": self.faces["vertIds"].ravel().tolist(),
+                },
+                "boundingSphere": {
+                    "center": Float32List(self.header.sphCenter),
+                    "radius": Float32(self.header.sphRadius),
+                },
+            },
+        }
+
+    def to_gltf(self, builder, material=None):
+        from .gltf import ELEMENT_ARRAY_BUFFER, TRIANGLES
+        vertCount = len(self.verts)
+        if not vertCount or not len(self.faces):
+            return None  # gltf meshes need at least one primitive
+
+        # w3d uvs have their origin top left just like gltf, no flip needed
+        attributes = {
+            "POSITION": builder.add_accessor(self.verts, bounds=True),
+        }
+        if len(self.normals) == vertCount:
+            attributes["NORMAL"] = builder.add_accessor(self.normals)
+        txCoords = self.txCoords()
+        if len(txCoords) == vertCount:
+            attributes["TEXCOORD_0"] = builder.add_accessor(txCoords)
+
+        indices = self.faces["vertIds"].ravel()
+        primitive = {
+            "attributes": attributes,
+            "indices": builder.add_accessor(indices.astype("<u2" if vertCount <= 0xFFFF else "<u4"), ELEMENT_ARRAY_BUFFER),
+            "mode": TRIANGLES,
+        }
+        if material is not None:
+            primitive["material"] = material
+
+        return builder.add("meshes", {
+            "name": self.header.meshName,
+            "primitives": [primitive],
+        })
+
 
 class PivotWrapper(Wrapper):
     def __init__(self, *args, **kwargs):
@@ -298,7 +652,7 @@ class PivotWrapper(Wrapper):
             "name": self.name,
             "type": "Mesh" if self.mesh is not None else "Other",
             "uuid": self.uuid(),
-            "matrix": [item for item in matrix4x4(t(self.position), self.rotation)],
+            "matrix": self.matrix(),
             "visible": True,
             "children": [ pivot.to_json() for pivot in self.children ],
         }
@@ -309,7 +663,35 @@ class PivotWrapper(Wrapper):
 
         return data
 
+    def to_gltf(self, builder):
+        node = {
+            "name": self.name,
+            "matrix": self.matrix(),
+        }
+        children = [ pivot.to_gltf(builder) for pivot in self.children ]
+        if children:
+            node["children"] = children
+
+        if self.mesh:
+            mesh = self.mesh
+            material = wrapMaterial(mesh)
+            index = builder.ref(mesh, lambda: mesh.to_gltf(builder, material.to_gltf(builder)))
+            if index is not None:
+                node["mesh"] = index
+
+        return builder.add("nodes", node)
+
+    def matrix(self):
+        # computed from the float32 position and rotation of the pivot
+        return Float32List(matrix4x4(t(self.position), self.rotation))
+
 def createMaterial(mesh):
+    return wrapMaterial(mesh).uuid()
+
+def wrapMaterial(mesh):
+    if mesh.material is not None:  # wrapped before or merged into an atlas material
+        return mesh.material
+
     assert len(mesh.vertMatls), mesh.header.meshName
 #    assert len(mesh.textures), mesh.header.meshName
     assert len(mesh.vertMatls) >= 1, mesh.vertMatls
@@ -325,7 +707,8 @@ def createMaterial(mesh):
         material.texture = TextureWrapper.wrap(texture.name)
     material.vertMatl = vertMatl
 
-    return material.uuid()
+    mesh.material = material
+    return material
 
 class MaterialWrapper(Wrapper):
     _cache = {}
@@ -348,8 +731,8 @@ class MaterialWrapper(Wrapper):
             "shading": "phong",
             "blending": "NormalBlending",
 
-            "opacity": self.vertMatl.vmInfo.opacity,
-            "shininess": self.vertMatl.vmInfo.shininess,
+            "opacity": Float32(self.vertMatl.vmInfo.opacity),
+            "shininess": Float32(self.vertMatl.vmInfo.shininess),
 
 #            "diffuse": rgba_to_hex(self.vertMatl.vmInfo.diffuse),  # TODO: wrong numbers ??
 #            "ambient": rgba_to_hex(self.vertMatl.vmInfo.ambient),  # TODO: wrong numbers ??
@@ -365,6 +748,31 @@ class MaterialWrapper(Wrapper):
 
         return data
 
+    def to_gltf(self, builder):
+        return builder.ref(self, lambda: builder.add("materials", self._gltf_material(builder)))
+
+    def _gltf_material(self, builder):
+        vmInfo = self.vertMatl.vmInfo
+        pbr = {
+            "baseColorFactor": [1.0, 1.0, 1.0, vmInfo.opacity],
+            "metallicFactor": 0.0,
+            "roughnessFactor": 1.0,
+        }
+        if self.texture:
+            if self.texture.ready():
+                pbr["baseColorTexture"] = {"index": self.texture.to_gltf(builder)}
+            else:
+                logger.warn("%s: texture isn't ready" % self.uuid())
+
+        data = {
+            "name": self.uuid(),
+            "pbrMetallicRoughness": pbr,
+            "emissiveFactor": [ c / 255.0 for c in (vmInfo.emissive.r, vmInfo.emissive.g, vmInfo.emissive.b) ],
+        }
+        if vmInfo.opacity < 1.0:
+            data["alphaMode"] = "BLEND"
+        return data
+
 class TextureWrapper(Wrapper):
     _cache = {}
     def __init__(self, *args, **kwargs):
@@ -388,9 +796,22 @@ class TextureWrapper(Wrapper):
             logger.warn("%s: image isn't ready" % self.ref())
         return data
 
+    def to_gltf(self, builder):
+        return builder.ref(self, lambda: builder.add("textures", {
+            "name": self.name,
+            "source": self.image.to_gltf(builder),
+        }))
+
     def ready(self):
         return self.image.ready()
 
+JPEG_QUALITY = 75
+DXT_QUALITY = "range"   # or "cluster", see dds.encoder
+DXT_MIPMAPS = True      # full mip chain for DXT encoded textures
+
+class NotSupportedError(NotImplementedError):
+    pass
+
 class ImageWrapper(Wrapper):
     _cache = {}
     def __init__(self, *args, **kwargs):
@@ -398,6 +819,7 @@ class ImageWrapper(Wrapper):
         self.name = self._wrapped
         self._wrapped = None
         self.url = None
+        self.file = None  # local path of the exported image
         self.error = None
 
     def ref(self):
@@ -415,49 +837,171 @@ class ImageWrapper(Wrapper):
     def ready(self):
         return self.error is None
 
+    def to_gltf(self, builder):
+        def add():
+            import os.path
+            mimeType = {".jpg": "image/jpeg", ".png": "image/png"}[os.path.splitext(self.file)[1].lower()]
+            with open(self.file, "rb") as fr:
+                return builder.add_image(fr.read(), mimeType, name=self.name)
+        return builder.ref(self, add)
+
     def fix_file(self, texture_paths=[]):
-        logger.debug(texture_paths)
+        """ find the file on disk, trying .dds and .tga if the named one is missing """
+        from .textureindex import TextureIndex
         import os.path
-        path, ext = os.path.splitext(self.name.lower())
-        for e in [ext] + [".dds", ".tga"]:
-            for root in texture_paths:
-                logger.debug("test: %s" % os.path.join(root, path+e))
-                if os.path.exists(os.path.join(root, path+e)):
-                    path = os.path.join(root, path)
-                    ext = e
-                    self.url = os.path.relpath("%s%s" % (path, ext), root)
-                    self.root = root
-                    logger.debug("found: %s" % self.url)
-                    return
-        raise FileNotFoundError(self.name)
-
-    def export(self, ext=".jpg", folder="."):
+        path, ext = os.path.splitext(self.name)
+        extensions = [ext.lower()] + [ e for e in (".dds", ".tga") if e != ext.lower() ]
+        found = TextureIndex.find(path, extensions, texture_paths or [])
+        if found is None:
+            raise FileNotFoundError(self.name)
+        self.root, self.url = found
+        logger.debug("found: %s" % self.url)
+
+    def export(self, ext=".jpg", folder=".", max_size=None, cache=None):
+        """
+        max_size bounds the longer side of converted images, dds files then
+        only decode the smallest mip level that is still large enough. tga
+        files with alpha become png.
+
+        With ext=".ktx" the DXT blocks of dds files are copied to a KTX file
+        (for WEBGL_compressed_texture_s3tc) without decoding, tga and jpeg
+        files are DXT encoded into one. Anything that fails falls back to
+        jpeg.
+
+        A TextureCache reuses earlier conversions of the same source content
+        with the same parameters.
+        """
         import os.path
         path, e = os.path.splitext(self.url)
+        e = e.lower()
 
-        if e == ".jpg":
-            pass
-        elif e == ".dds":
-            to_url = os.path.join(folder, self.url+".jpg")
-
-            folder, a = os.path.split(to_url)
+        if e == ".jpg" and ext != ".ktx":
+            self.file = os.path.join(self.root, self.url)
+        elif e in (".dds", ".tga", ".jpg"):
             try:
-                os.makedirs(folder)
+                os.makedirs(os.path.dirname(os.path.join(folder, self.url)))
             except FileExistsError:
                 pass
 
-            try:
-                logger.debug("convert: %s" % self.url)
-                from .dds import DDS
-                im = DDS(os.path.join(self.root, self.url))
-                im.save(to_url)
-                self.url = to_url
-            except ValueError as e:
-                logger.exception("Couldn't convert image - skipping...")
-                self.error = e
+            if cache:
+                key = cache.key(os.path.join(self.root, self.url), format=ext, size=max_size, quality=JPEG_QUALITY,
+                    dxt=DXT_QUALITY, mipmaps=DXT_MIPMAPS)
+                cached = cache.get(key)
+                if cached:
+                    import shutil
+                    to_url = os.path.join(folder, self.url + os.path.splitext(cached)[1])
+                    logger.debug("cached: %s" % self.url)
+                    shutil.copyfile(cached, to_url)
+                    self.url = self.file = to_url
+                    return
+
+            done = False
+            if ext == ".ktx":
+                done = self.export_ktx(folder, max_size) if e == ".dds" else self.encode_ktx(folder, max_size)
+            if not done:
+                self.convert(folder, max_size)
+
+            if cache and self.ready():
+                cache.put(key, self.file)
         else:
             raise NotSupportedError(e)
 
+    def load_image(self, max_size=None):
+        """
+        the source image, scaled down to max_size, and whether it has
+        (not fully opaque) alpha
+        """
+        import os.path
+        from PIL import Image
+        e = os.path.splitext(self.url)[1].lower()
+        if e == ".tga":
+            from .tga import TGA
+            im = TGA(os.path.join(self.root, self.url))
+        elif e == ".dds":
+            from .dds import DDS
+            im = DDS(os.path.join(self.root, self.url))
+        else:
+            im = Image.open(os.path.join(self.root, self.url))
+        if max_size and max(im.size) > max_size:
+            scale = float(max_size) / max(im.size)
+            size = max(1, int(round(im.size[0] * scale))), max(1, int(round(im.size[1] * scale)))
+            im.draft(None, size)
+            if im.size != size:
+                im = im.resize(size, Image.BICUBIC)
+        # decoded RGBA (tga, dds DXT3/5 or DXT1 with alpha) that isn't fully opaque
+        alpha = im.mode == "RGBA" and im.getextrema()[3][0] < 255
+        return im, alpha
+
+    def convert(self, folder=".", max_size=None):
+        """ decode the source, save it as png if it has alpha, as jpeg otherwise """
+        import os.path
+        try:
+            logger.debug("convert: %s" % self.url)
+            im, alpha = self.load_image(max_size)
+            if alpha:
+                to_url = os.path.join(folder, self.url+".png")
+                im.save(to_url)
+            else:
+                to_url = os.path.join(folder, self.url+".jpg")
+                if im.mode != "RGB":  # jpeg has no alpha
+                    im = im.convert("RGB")
+                im.save(to_url, quality=JPEG_QUALITY)
+            self.url = self.file = to_url
+        except ValueError as e:
+            logger.exception("Couldn't convert image - skipping...")
+            self.error = e
+
+    def export_ktx(self, folder=".", max_size=None):
+        """ copy the compressed mip levels of a dds, False if it has none """
+        import os.path
+        from .dds import DDS
+        from .dds.ktx import saveKTX
+
+        to_url = os.path.join(folder, self.url+".ktx")
+        try:
+            logger.debug("copy blocks: %s" % self.url)
+            im = DDS(os.path.join(self.root, self.url))
+            with open(to_url, "wb") as fw:
+                saveKTX(im, fw, maxSize=max_size)
+        except ValueError as e:
+            logger.warn("%s: no ktx (%s), using jpeg" % (self.url, e))
+            if os.path.exists(to_url):
+                os.remove(to_url)
+            return False
+        self.url = self.file = to_url
+        return True
+
+    def encode_ktx(self, folder=".", max_size=None):
+        """ DXT1 (DXT5 with alpha) encode the source into a KTX, False if that fails """
+        import os.path
+        from .dds.encoder import encodeDXT1, encodeDXT5, mipChain
+        from .dds.ktx import writeKTX
+
+        to_url = os.path.join(folder, self.url+".ktx")
+        try:
+            logger.debug("encode: %s" % self.url)
+            im, alpha = self.load_image(max_size)
+            pixels = numpy.asarray(im.convert("RGBA" if alpha else "RGB"))
+            levels = mipChain(pixels) if DXT_MIPMAPS else [pixels]
+            encode = encodeDXT5 if alpha else encodeDXT1
+            with open(to_url, "wb") as fw:
+                writeKTX(fw, b"DXT5" if alpha else b"DXT1", "RGBA" if alpha else "RGB", im.size,
+                    [ encode(level, DXT_QUALITY) for level in levels ])
+        except ValueError as e:
+            logger.warn("%s: no ktx (%s), using jpeg" % (self.url, e))
+            if os.path.exists(to_url):
+                os.remove(to_url)
+            return False
+        self.url = self.file = to_url
+        return True
+
+def exportImage(name, texture_paths, ext, folder, max_size, cache):
+    """ export_images for a single image in a worker process, returns the resulting state """
+    image = ImageWrapper(name)
+    image.fix_file(texture_paths=texture_paths)
+    image.export(ext=ext, folder=folder, max_size=max_size, cache=cache)
+    return image.root, image.url, image.file, image.error
+
 
 class __MaterialWrapper(Wrapper):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Texture atlases
+
+Small textures are packed into shared atlas images, so meshes that used
+separate textures can share one material: fewer images to load and fewer
+draw calls. Packing is done on shelves sorted by height. Every texture gets a
+border of repeated edge pixels, so filtering and mip maps don't bleed the
+neighbours in.
+
+Texture coordinates have their origin top left (like DirectX and glTF), the
+atlas region of a texture maps uv to offset + uv * scale.
+"""
+
+import numpy
+
+
+# border of repeated edge pixels around every texture
+PADDING = 2
+
+
+def nextPowerOfTwo(value):
+    power = 1
+    while power < value:
+        power *= 2
+    return power
+
+
+class Atlas(object):
+
+    def __init__(self, size, padding=PADDING):
+        self.size = size            # maximum width and height
+        self.padding = padding
+        self.regions = {}           # key -> (x, y, width, height) of the texture without its border
+        self._shelf = [0, 0, 0]     # x, y, height of the shelf being filled
+
+    @property
+    def width(self):
+        # a power of two for mip maps, unless that grows past size
+        return min(self.size, nextPowerOfTwo(max(x + w + self.padding for x, y, w, h in self.regions.values())))
+
+    @property
+    def height(self):
+        return min(self.size, nextPowerOfTwo(max(y + h + self.padding for x, y, w, h in self.regions.values())))
+
+    def place(self, key, size):
+        """ add a texture of size (width, height), False if it doesn't fit anymore """
+        width, height = size[0] + 2 * self.padding, size[1] + 2 * self.padding
+        x, y, shelfHeight = self._shelf
+        if x + width > self.size:   # start a new shelf
+            x, y, shelfHeight = 0, y + shelfHeight, 0
+        if x + width > self.size or y + height > self.size:
+            return False
+        self.regions[key] = (x + self.padding, y + self.padding, size[0], size[1])
+        self._shelf = [x + width, y, max(shelfHeight, height)]
+        return True
+
+    def transform(self, key):
+        """ (scale, offset) mapping the uvs of a texture into the atlas """
+        x, y, w, h = self.regions[key]
+        scale = numpy.array([float(w) / self.width, float(h) / self.height], numpy.float32)
+        offset = numpy.array([float(x) / self.width, float(y) / self.height], numpy.float32)
+        return scale, offset
+
+    def compose(self, images, channels=3):
+        """ images: key -> (height, width, channels) uint8 arrays, returns the atlas array """
+        pad = self.padding
+        atlas = numpy.zeros((self.height, self.width, channels), numpy.uint8)
+        for key, (x, y, w, h) in self.regions.items():
+            pixels = numpy.pad(images[key], ((pad, pad), (pad, pad), (0, 0)), mode="edge")
+            atlas[y - pad:y + h + pad, x - pad:x + w + pad] = pixels
+        return atlas
+
+
+def packTextures(sizes, size, padding=PADDING):
+    """
+    sizes: key -> (width, height) of the textures to pack, all have to fit
+    into size x size including their border. Returns the list of atlases.
+    """
+    atlases = []
+    for key in sorted(sizes, key=lambda key: (sizes[key][1], sizes[key][0]), reverse=True):
+        if not atlases or not atlases[-1].place(key, sizes[key]):
+            atlases.append(Atlas(size, padding))
+            if not atlases[-1].place(key, sizes[key]):
+                raise ValueError("Texture of %dx%d doesn't fit into a %d atlas" % (sizes[key] + (size,)))
+    return atlases
@@ -6,7 +6,7 @@ The DDS file format is described (somewhat) at:
  http://msdn.microsoft.com/en-us/library/ee418142(VS.85).aspx
  https://msdn.microsoft.com/en-us/library/windows/desktop/dn424129(v=vs.85).aspx
 
-The DTX1 texture format is described at:
+The DXT1/3/5 texture formats are described at:
  http://oss.sgi.com/projects/ogl-sample/registry/EXT/texture_compression_s3tc.txt
 """
 
@@ -14,7 +14,7 @@ from struct import unpack
 
 from PIL import Image, ImageFile
 
-from .decoder import decodeDXT1
+from .decoder import blockCount, decodeDXT1, decodeDXT3, decodeDXT5
 
 
 
@@ -57,7 +57,10 @@ class DDS(ImageFile.ImageFile):
             raise ValueError("Not a DDS file")
 
         dwSize, dwFlags, dwHeight, dwWidth, dwPitchLinear, dwDepth, dwMipMapCount, ddpfPixelFormat, ddsCaps = unpack("<IIIIIII 44x 32s 16s 4x", header[4:])
-        self.size = dwWidth, dwHeight
+        self._size = dwWidth, dwHeight
+        self._baseSize = dwWidth, dwHeight
+        self._mipMapCount = dwMipMapCount if (dwFlags & DDSD_MIPMAPCOUNT) and dwMipMapCount else 1
+        self._offset = 128 # top level follows the header
 
         if dwSize != 124:
             raise ValueError("Expected dwSize == 124, got %d" % (dwSize))
@@ -73,44 +76,78 @@ class DDS(ImageFile.ImageFile):
         if (caps_dwCaps1 & DDSCAPS_EXPECTED) != DDSCAPS_EXPECTED:
             raise ValueError("Unsupported image caps: %08x" % (caps_dwCaps1))
 
-        # check for DXT1
+        # check for DXT1/3/5
+        self.fourCC = None
         if (pf_dwFlags & DDPF_FOURCC != 0):
+            self.fourCC = pf_dwFourCC
             if pf_dwFourCC == b"DXT1":
                 if (pf_dwFlags & DDPF_ALPHAPIXELS != 0):
-                    raise NotImplementedError("DXT1 with Alpha not supported yet")
+                    self._mode = "RGBA"
+                    self._decode = lambda data, width, height: decodeDXT1(data, width, height, alpha=True)
                 else:
-                    self.mode = "RGB"
-                    self.load = self._loadDXTOpaque
+                    self._mode = "RGB"
+                    self._decode = decodeDXT1
+                self._blockSize = 8
+            elif pf_dwFourCC == b"DXT3":
+                self._mode = "RGBA"
+                self._decode = decodeDXT3
+                self._blockSize = 16
+            elif pf_dwFourCC == b"DXT5":
+                self._mode = "RGBA"
+                self._decode = decodeDXT5
+                self._blockSize = 16
             else:
                 raise ValueError("Unsupported FOURCC mode: %s" % (pf_dwFourCC))
+            self.load = self._loadDXT
 
         else:
             # XXX is this right? I don't have an uncompressed dds to play with
-            self.mode = "RGB"
+            # 32 bit X8R8G8B8, little endian so blue comes first, rows of pitch bytes
+            self._mode = "RGB"
             # Construct the tile
-            self.tile = [("raw", (0, 0, dwWidth, dwHeight), 128, ("RGBX", dwPitchLinear - dwWidth, 1))]
-
-    def _loadDXTOpaque(self):
+            self.tile = [("raw", (0, 0, dwWidth, dwHeight), 128, ("BGRX", dwPitchLinear or 4 * dwWidth, 1))]
+
+    def mipLevels(self):
+        """
+        (offset, (width, height)) of every stored mip level, ValueError for
+        an uncompressed image
+        """
+        levels = []
+        offset = 128
+        width, height = self._baseSize
+        for level in range(self._mipMapCount):
+            levels.append((offset, (width, height)))
+            offset += self.mipLevelSize((width, height))
+            width, height = max(1, width // 2), max(1, height // 2)
+        return levels
+
+    def mipLevelSize(self, size):
+        """ bytes of the blocks of a mip level """
+        if self.fourCC is None:
+            raise ValueError("No DXT blocks in an uncompressed DDS")
+        bx, by = blockCount(*size)
+        return bx * by * self._blockSize
+
+    def draft(self, mode, size):
+        """
+        Select the smallest stored mip level that is still at least size, so
+        load() decodes only that one. Has to be called before load().
+        """
+        if self._loaded or size is None or self.load != self._loadDXT:
+            return
+        for offset, levelSize in self.mipLevels():
+            if levelSize[0] < size[0] or levelSize[1] < size[1]:
+                break
+            self._offset = offset
+            self._size = levelSize
+
+    def _loadDXT(self):
         if self._loaded: return
 
-        # one entry per Y row, we join them up at the end
-        data = []
-        self.fp.seek(128) # skip header
-
-        linesize = int((self.size[0] + 3) / 4) * 8 # Number of data byte per row
-
-        baseoffset = 0
-        for yb in range(int((self.size[1] + 3) / 4)):
-            linedata = self.fp.read(linesize)
-            decoded = decodeDXT1(linedata) # returns 4-tuple of RGB lines
-            for d in decoded:
-                # Make sure that if we have a texture size that's not a
-                # multiple of 4 that we correctly truncate the returned data
-                data.append(d[:self.size[0]*3])
+        self.fp.seek(self._offset) # skip header and larger mip levels
+        data = self.fp.read(self.mipLevelSize(self.size))
+        pixels = self._decode(data, *self.size)
 
-        # Now build the final image from our data strings
-        data = b"".join(data[:self.size[1]])
         self.im = Image.core.new(self.mode, self.size)
-        # self.fromstring(data)
-        self.frombytes(data)
+        self.frombytes(pixels.tobytes())
         self._loaded = 1
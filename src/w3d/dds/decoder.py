@@ -1,195 +1,126 @@
 # -*- coding: utf-8 -*-
+"""
+S3TC block decoders
 
-from struct import unpack
+Every decoder takes the data of a whole mip level and decodes all 4x4 blocks
+at once with numpy: unpack the 5-6-5 endpoints, build each block's palette and
+gather the pixels by their 2 bit codes. The result is a (height, width, channels)
+uint8 array.
+"""
 
-def build_bytes(*vals):
-    res = bytes()
-    for val in vals:
-        res += bytes((int(val),))
-    return res
+import numpy
 
-def decodeDXT1(data, alpha=False):
+
+# 8 byte DXT1 color block
+DXT1_BLOCK = numpy.dtype([("color0", "<u2"), ("color1", "<u2"), ("bits", "<u4")])
+
+# 16 byte DXT3 block: 4 bit alpha per pixel + color block
+DXT3_BLOCK = numpy.dtype([("alpha", "<u8"), ("color0", "<u2"), ("color1", "<u2"), ("bits", "<u4")])
+
+# 16 byte DXT5 block: two alpha endpoints, 3 bit alpha codes + color block
+DXT5_BLOCK = numpy.dtype([("alpha0", "u1"), ("alpha1", "u1"), ("alphaBits", "u1", 6),
+                          ("color0", "<u2"), ("color1", "<u2"), ("bits", "<u4")])
+
+
+def blockCount(width, height):
+    """ number of 4x4 blocks along x and y """
+    return (width + 3) // 4, (height + 3) // 4
+
+def unpack565(color):
+    """ packed 5-6-5 colors -> (..., 3) rgb """
+    color = color.astype(numpy.int32)
+    return numpy.stack([
+        ((color >> 11) & 0x1f) << 3,
+        ((color >> 5) & 0x3f) << 2,
+        (color & 0x1f) << 3,
+    ], axis=-1)
+
+def colorPalette(color0, color1, alpha=False, fourColors=False):
     """
-    input: one "row" of data (i.e. will produce 4*width pixels)
+    the four colors of every block as (blocks, 4, 3), with alpha (blocks, 4, 4)
+    where the 3rd color of a color0 <= color1 block is transparent black.
+    DXT3/5 color blocks always use four colors.
     """
-
-    blocks = int(len(data) / 8)  # number of blocks in row
-    finalColor = [b"", b"", b"", b""]  # row accumulators
-
-    for i, block in enumerate(range(blocks)):
-        # Decode next 8-byte block.
-        color0, color1, bits = unpack("<HHI", data[block*8:block*8+8])
-#        print(i, color0, color1, bits)
-
-        # color 0, packed 5-6-5
-        r0 = ((color0 >> 11) & 0x1f) << 3
-        g0 = ((color0 >> 5) & 0x3f) << 2
-        b0 = (color0 & 0x1f) << 3
-
-        # color 1, packed 5-6-5
-        r1 = ((color1 >> 11) & 0x1f) << 3
-        g1 = ((color1 >> 5) & 0x3f) << 2
-        b1 = (color1 & 0x1f) << 3
-
-        # Decode this block into 4x4 pixels
-        # Accumulate the results onto our 4 row accumulators
-        for j in range(4):
-            for _ in range(4):
-                # get next control op and generate a pixel
-
-                control = bits & 3
-                bits = bits >> 2
-                if control == 0:
-#                    finalColor[j] += chr(r0) + chr(g0) + chr(b0)
-                    finalColor[j] += build_bytes(r0, g0, b0)
-                elif control == 1:
-#                    finalColor[j] += chr(r1) + chr(g1) + chr(b1)
-                    finalColor[j] += build_bytes(r1, g1, b1)
-                elif control == 2:
-                    if color0 > color1:
-#                        finalColor[j] += chr(int((2 * r0 + r1) / 3)) + chr(int((2 * g0 + g1) / 3)) + chr(int((2 * b0 + b1) / 3))
-                        finalColor[j] += build_bytes((2 * r0 + r1) / 3, (2 * g0 + g1) / 3, (2 * b0 + b1) / 3)
-                    else:
-#                        finalColor[j] += chr(int((r0 + r1) / 2)) + chr(int((g0 + g1) / 2)) + chr(int((b0 + b1) / 2))
-                        finalColor[j] += build_bytes((r0 + r1) / 2, (g0 + g1) / 2, (b0 + b1) / 2)
-                elif control == 3:
-                    if color0 > color1:
-#                        finalColor[j] += chr(int((2 * r1 + r0) / 3)) + chr(int((2 * g1 + g0) / 3)) + chr(int((2 * b1 + b0) / 3))
-                        finalColor[j] += build_bytes((2 * r1 + r0) / 3, (2 * g1 + g0) / 3, (2 * b1 + b0) / 3)
-                    else:
-                        if alpha:
-#                            finalColor[j] += "\0\0\0\0"
-                            finalColor[j] += bytes((0,0,0,0))
-                            continue
-                        else:
-#                            finalColor[j] += "\0\0\0"
-                            finalColor[j] += bytes((0,0,0))
-                if alpha:
-                    finalColor[j] += bytes((255,)) #chr(0xFF)
-
-    return tuple(finalColor)
-
-
-def decodeDXT3(data):
+    c0 = unpack565(color0)
+    c1 = unpack565(color1)
+    opaque = (color0 > color1)[:, None] | fourColors
+    c2 = numpy.where(opaque, (2 * c0 + c1) // 3, (c0 + c1) // 2)
+    c3 = numpy.where(opaque, (2 * c1 + c0) // 3, 0)
+    palette = numpy.stack([c0, c1, c2, c3], axis=1)
+    if alpha:
+        a = numpy.full(palette.shape[:2] + (1,), 255, numpy.int32)
+        a[:, 3, 0] = numpy.where(opaque[:, 0], 255, 0)
+        palette = numpy.concatenate([palette, a], axis=2)
+    return palette.astype(numpy.uint8)
+
+def alphaPalette(alpha0, alpha1):
+    """ the eight DXT5 alpha values of every block as (blocks, 8) """
+    a0 = alpha0.astype(numpy.int32)[:, None]
+    a1 = alpha1.astype(numpy.int32)[:, None]
+    code = numpy.arange(2, 8)
+    eight = ((8 - code) * a0 + (code - 1) * a1) // 7
+    six = ((6 - code) * a0 + (code - 1) * a1) // 5
+    six[:, 4] = 0
+    six[:, 5] = 255
+    palette = numpy.concatenate([a0, a1, numpy.where(a0 > a1, eight, six)], axis=1)
+    return palette.astype(numpy.uint8)
+
+def blockCodes(bits, bitsPerCode=2):
+    """ per pixel codes (blocks, 16) of packed little endian code bits """
+    shifts = numpy.arange(16, dtype=bits.dtype) * bitsPerCode
+    return ((bits[:, None] >> shifts) & ((1 << bitsPerCode) - 1)).astype(numpy.uint8)
+
+def gather(palette, codes):
+    """ (blocks, 16, channels) pixels picked from each block's palette """
+    return palette[numpy.arange(len(palette))[:, None], codes]
+
+def assembleBlocks(pixels, width, height):
+    """ (blocks, 16, channels) in row major block order -> (height, width, channels) """
+    bx, by = blockCount(width, height)
+    channels = pixels.shape[-1]
+    image = pixels.reshape(by, bx, 4, 4, channels).transpose(0, 2, 1, 3, 4).reshape(by * 4, bx * 4, channels)
+    return image[:height, :width]
+
+
+def decodeDXT1(data, width, height, alpha=False):
     """
-    input: one "row" of data (i.e. will produce 4*width pixels)
+    input: all blocks of a width x height mip level
+    output: (height, width, 3) rgb or (height, width, 4) rgba array
     """
+    bx, by = blockCount(width, height)
+    blocks = numpy.frombuffer(data, dtype=DXT1_BLOCK, count=bx * by)
+    palette = colorPalette(blocks["color0"], blocks["color1"], alpha)
+    pixels = gather(palette, blockCodes(blocks["bits"]))
+    return assembleBlocks(pixels, width, height)
+
 
-    blocks = len(data) / 16  # number of blocks in row
-    finalColor = ["", "", "", ""]  # row accumulators
-
-    for block in xrange(blocks):
-        block = data[block*16:block*16+16]
-        # Decode next 16-byte block.
-        bits = unpack("<8B", block[:8])
-        color0, color1 = unpack("<HH", block[8:12])
-
-        code, = unpack("<I", block[12:])
-
-        # color 0, packed 5-6-5
-        r0 = ((color0 >> 11) & 0x1f) << 3
-        g0 = ((color0 >> 5) & 0x3f) << 2
-        b0 = (color0 & 0x1f) << 3
-
-        # color 1, packed 5-6-5
-        r1 = ((color1 >> 11) & 0x1f) << 3
-        g1 = ((color1 >> 5) & 0x3f) << 2
-        b1 = (color1 & 0x1f) << 3
-        for j in xrange(4):
-            high = False # Do we want the higher bits?
-            for i in xrange(4):
-                if high:
-                    high = False
-                else:
-                    high = True
-                alphaCodeIndex = (4*j+i) / 2
-                finalAlpha = bits[alphaCodeIndex]
-                if high:
-                    finalAlpha &= 0xf
-                else:
-                    finalAlpha >>= 4
-                finalAlpha *= 17 # We get a value between 0 and 15
-
-                colorCode = (code >> 2*(4*j+i)) & 0x03
-
-                if colorCode == 0:
-                    finalColor[j] += chr(r0) + chr(g0) + chr(b0) + chr(finalAlpha)
-                elif colorCode == 1:
-                    finalColor[j] += chr(r1) + chr(g1) +  chr(b1) + chr(finalAlpha)
-                elif colorCode == 2:
-                    finalColor[j] += chr((2*r0+r1)/3) + chr((2*g0+g1)/3) + chr((2*b0+b1)/3) + chr(finalAlpha)
-                elif colorCode == 3:
-                    finalColor[j] += chr((r0+2*r1)/3) + chr((g0+2*g1)/3) + chr((b0+2*b1)/3) + chr(finalAlpha)
-    return tuple(finalColor)
-
-
-def decodeDXT5(data):
+def decodeDXT3(data, width, height):
     """
-    input: one "row" of data (i.e. will produce 4*width pixels)
+    input: all blocks of a width x height mip level
+    output: (height, width, 4) rgba array, explicit 4 bit alpha
     """
+    bx, by = blockCount(width, height)
+    blocks = numpy.frombuffer(data, dtype=DXT3_BLOCK, count=bx * by)
+    palette = colorPalette(blocks["color0"], blocks["color1"], fourColors=True)
+    pixels = numpy.empty((len(blocks), 16, 4), numpy.uint8)
+    pixels[:, :, :3] = gather(palette, blockCodes(blocks["bits"]))
+    pixels[:, :, 3] = blockCodes(blocks["alpha"], 4) * 17
+    return assembleBlocks(pixels, width, height)
 
-    blocks = len(data) / 16  # number of blocks in row
-    finalColor = ["", "", "", ""]  # row accumulators
-
-    for block in xrange(blocks):
-        block = data[block*16:block*16+16]
-        # Decode next 16-byte block.
-        alpha0, alpha1 = unpack("<BB", block[:2])
-
-        bits = unpack("<6B", block[2:8])
-        alphaCode1 = bits[2] | (bits[3] << 8) | (bits[4] << 16) | (bits[5] << 24)
-        alphaCode2 = bits[0] | (bits[1] << 8)
-
-        color0, color1 = unpack("<HH", block[8:12])
-
-        code, = unpack("<I", block[12:])
-
-        # color 0, packed 5-6-5
-        r0 = ((color0 >> 11) & 0x1f) << 3
-        g0 = ((color0 >> 5) & 0x3f) << 2
-        b0 = (color0 & 0x1f) << 3
-
-        # color 1, packed 5-6-5
-        r1 = ((color1 >> 11) & 0x1f) << 3
-        g1 = ((color1 >> 5) & 0x3f) << 2
-        b1 = (color1 & 0x1f) << 3
-
-        for j in xrange(4):
-            for i in xrange(4):
-                # get next control op and generate a pixel
-                alphaCodeIndex = 3*(4*j+i)
-
-                if alphaCodeIndex <= 12:
-                    alphaCode = (alphaCode2 >> alphaCodeIndex) & 0x07
-                elif alphaCodeIndex == 15:
-                    alphaCode = (alphaCode2 >> 15) | ((alphaCode1 << 1) & 0x06)
-                else: # alphaCodeIndex >= 18 and alphaCodeIndex <= 45
-                    alphaCode = (alphaCode1 >> (alphaCodeIndex - 16)) & 0x07
-
-                if alphaCode == 0:
-                    finalAlpha = alpha0
-                elif alphaCode == 1:
-                    finalAlpha = alpha1
-                else:
-                    if alpha0 > alpha1:
-                        finalAlpha = ((8-alphaCode)*alpha0 + (alphaCode-1)*alpha1)/7
-                    else:
-                        if alphaCode == 6:
-                            finalAlpha = 0
-                        elif alphaCode == 7:
-                            finalAlpha = 255
-                        else:
-                            finalAlpha = ((6-alphaCode)*alpha0 + (alphaCode-1)*alpha1)/5
-
-                colorCode = (code >> 2*(4*j+i)) & 0x03
-
-                if colorCode == 0:
-                    finalColor[j] += chr(r0) + chr(g0) + chr(b0) + chr(finalAlpha)
-                elif colorCode == 1:
-                    finalColor[j] += chr(r1) + chr(g1) +  chr(b1) + chr(finalAlpha)
-                elif colorCode == 2:
-                    finalColor[j] += chr((2*r0+r1)/3) + chr((2*g0+g1)/3) + chr((2*b0+b1)/3) + chr(finalAlpha)
-                elif colorCode == 3:
-                    finalColor[j] += chr((r0+2*r1)/3) + chr((g0+2*g1)/3) + chr((b0+2*b1)/3) + chr(finalAlpha)
-
-    return tuple(finalColor)
+
+def decodeDXT5(data, width, height):
+    """
+    input: all blocks of a width x height mip level
+    output: (height, width, 4) rgba array, interpolated alpha
+    """
+    bx, by = blockCount(width, height)
+    blocks = numpy.frombuffer(data, dtype=DXT5_BLOCK, count=bx * by)
+    palette = colorPalette(blocks["color0"], blocks["color1"], fourColors=True)
+    # 48 bits of 3 bit alpha codes
+    alphaBits = numpy.zeros(len(blocks), numpy.uint64)
+    for i in range(6):
+        alphaBits |= blocks["alphaBits"][:, i].astype(numpy.uint64) << numpy.uint64(8 * i)
+    pixels = numpy.empty((len(blocks), 16, 4), numpy.uint8)
+    pixels[:, :, :3] = gather(palette, blockCodes(blocks["bits"]))
+    pixels[:, :, 3] = gather(alphaPalette(blocks["alpha0"], blocks["alpha1"]), blockCodes(alphaBits, 3))
+    return assembleBlocks(pixels, width, height)
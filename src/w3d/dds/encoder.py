@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+S3TC block encoders
+
+The counterpart of the decoders: all 4x4 blocks of a mip level are encoded at
+once with numpy. Two quality levels pick the color endpoints:
+
+ "range"    endpoints at the ends of each block's principal axis (fast)
+ "cluster"  range fit, then the endpoints are refined by least squares for
+            the chosen palette codes, kept where the error goes down
+
+Codes are chosen against palettes built by the decoder's own functions.
+"""
+
+import numpy
+
+from .decoder import DXT1_BLOCK, DXT5_BLOCK, blockCount, colorPalette, alphaPalette
+
+
+QUALITIES = ("range", "cluster")
+
+# blocks encoded at a time, bounds the size of the temporary arrays
+CHUNK_BLOCKS = 16384
+
+# weight of color0 for each of the four codes of an opaque block
+CODE_WEIGHTS = numpy.array([1.0, 0.0, 2.0 / 3, 1.0 / 3], numpy.float32)
+
+
+def splitBlocks(pixels):
+    """ (height, width, channels) -> (blocks, 16, channels) in row major block order """
+    height, width, channels = pixels.shape
+    bx, by = blockCount(width, height)
+    pixels = numpy.pad(pixels, ((0, by * 4 - height), (0, bx * 4 - width), (0, 0)), mode="edge")
+    return pixels.reshape(by, 4, bx, 4, channels).transpose(0, 2, 1, 3, 4).reshape(bx * by, 16, channels)
+
+def pack565(color):
+    """ (..., 3) rgb floats -> packed 5-6-5 colors """
+    color = numpy.clip(numpy.rint(color * (numpy.array([31, 63, 31]) / 255.0)), 0, [31, 63, 31]).astype(numpy.uint16)
+    return color[..., 0] << 11 | color[..., 1] << 5 | color[..., 2]
+
+def principalAxis(pixels):
+    """
+    mean (blocks, 3) and direction (blocks, 3) of largest variance of each
+    block. The power iteration starts at the covariance column of the most
+    varying channel, not grey, which is orthogonal to red against green.
+    Blocks without variance get their bounding box diagonal.
+    """
+    mean = pixels.mean(axis=1)
+    centered = pixels - mean[:, None]
+    covariance = numpy.einsum("bpi,bpj->bij", centered, centered)
+    channel = numpy.einsum("bii->bi", covariance).argmax(axis=1)
+    axis = numpy.take_along_axis(covariance, channel[:, None, None], axis=2)[:, :, 0]
+    for i in range(8):  # power iteration
+        axis /= numpy.maximum(numpy.abs(axis).max(axis=1), 1e-12)[:, None]
+        axis = numpy.einsum("bij,bj->bi", covariance, axis)
+    axis /= numpy.maximum(numpy.abs(axis).max(axis=1), 1e-12)[:, None]
+    flat = numpy.abs(axis).max(axis=1) < 1e-6
+    axis[flat] = (pixels.max(axis=1) - pixels.min(axis=1))[flat]
+    return mean, axis
+
+def closestCodes(pixels, palette):
+    """ codes (blocks, 16) of the nearest palette entries and the squared errors per block """
+    distance = ((pixels[:, :, None, :] - palette[:, None, :, :].astype(numpy.float32)) ** 2).sum(axis=-1)
+    codes = distance.argmin(axis=2)
+    return codes.astype(numpy.uint32), numpy.take_along_axis(distance, codes[:, :, None], axis=2).sum(axis=(1, 2))
+
+def fitColors(pixels, color0, color1):
+    """ codes for the packed endpoints, color0 > color1 so all blocks use four colors """
+    swap = color0 < color1
+    color0, color1 = numpy.where(swap, color1, color0), numpy.where(swap, color0, color1)
+    codes, error = closestCodes(pixels, colorPalette(color0, color1, fourColors=True))
+    codes[color0 == color1] = 0  # a single color, the block would be in three color mode
+    return color0, color1, codes, error
+
+def leastSquares(pixels, codes, color0, color1):
+    """ endpoints that best reproduce the pixels with the given codes """
+    w = CODE_WEIGHTS[codes]
+    aa = (w * w).sum(axis=1)
+    ab = (w * (1 - w)).sum(axis=1)
+    bb = ((1 - w) * (1 - w)).sum(axis=1)
+    ap = (w[:, :, None] * pixels).sum(axis=1)
+    bp = ((1 - w)[:, :, None] * pixels).sum(axis=1)
+    det = aa * bb - ab * ab
+    solvable = numpy.abs(det) > 1e-6
+    det = numpy.where(solvable, det, 1)[:, None]
+    end0 = (bb[:, None] * ap - ab[:, None] * bp) / det
+    end1 = (aa[:, None] * bp - ab[:, None] * ap) / det
+    return numpy.where(solvable, pack565(end0), color0), numpy.where(solvable, pack565(end1), color1)
+
+def encodeColors(pixels, quality="range"):
+    """ (blocks, 16, 3) pixels -> color0, color1 and packed code bits of every block """
+    if quality not in QUALITIES:
+        raise ValueError("Unknown quality: %s" % quality)
+    pixels = pixels.astype(numpy.float32)
+    mean, axis = principalAxis(pixels)
+    t = numpy.einsum("bpi,bi->bp", pixels - mean[:, None], axis) / numpy.maximum((axis * axis).sum(axis=1), 1e-12)[:, None]
+    color0 = pack565(mean + t.max(axis=1)[:, None] * axis)
+    color1 = pack565(mean + t.min(axis=1)[:, None] * axis)
+    color0, color1, codes, error = fitColors(pixels, color0, color1)
+
+    if quality == "cluster":
+        for i in range(3):
+            refined = fitColors(pixels, *leastSquares(pixels, codes, color0, color1))
+            better = refined[3] < error
+            color0, color1, codes, error = [ numpy.where(better[:, None] if new.ndim > 1 else better, new, old)
+                for new, old in zip(refined, (color0, color1, codes, error)) ]
+
+    bits = (codes << (numpy.arange(16, dtype=numpy.uint32) * 2)).sum(axis=1, dtype=numpy.uint32)
+    return color0, color1, bits
+
+def encodeAlpha(alpha):
+    """ (blocks, 16) alpha -> alpha0, alpha1 and the six code bytes of every block """
+    alpha0 = alpha.max(axis=1)
+    alpha1 = alpha.min(axis=1)
+    palette = alphaPalette(alpha0, alpha1).astype(numpy.int32)
+    codes = numpy.abs(alpha.astype(numpy.int32)[:, :, None] - palette[:, None, :]).argmin(axis=2).astype(numpy.uint64)
+    codes[alpha0 == alpha1] = 0
+    bits = (codes << (numpy.arange(16, dtype=numpy.uint64) * numpy.uint64(3))).sum(axis=1, dtype=numpy.uint64)
+    alphaBits = bits.astype("<u8").view(numpy.uint8).reshape(-1, 8)[:, :6]
+    return alpha0, alpha1, alphaBits
+
+
+def encodeDXT1(pixels, quality="range"):
+    """
+    input: (height, width, 3) rgb array
+    output: the DXT1 blocks of the image
+    """
+    blocks = splitBlocks(pixels[:, :, :3])
+    data = numpy.empty(len(blocks), DXT1_BLOCK)
+    for start in range(0, len(blocks), CHUNK_BLOCKS):
+        chunk = slice(start, start + CHUNK_BLOCKS)
+        data["color0"][chunk], data["color1"][chunk], data["bits"][chunk] = encodeColors(blocks[chunk], quality)
+    return data.tobytes()
+
+
+def encodeDXT5(pixels, quality="range"):
+    """
+    input: (height, width, 4) rgba array
+    output: the DXT5 blocks of the image
+    """
+    blocks = splitBlocks(pixels)
+    data = numpy.empty(len(blocks), DXT5_BLOCK)
+    for start in range(0, len(blocks), CHUNK_BLOCKS):
+        chunk = slice(start, start + CHUNK_BLOCKS)
+        data["alpha0"][chunk], data["alpha1"][chunk], data["alphaBits"][chunk] = encodeAlpha(blocks[chunk, :, 3])
+        data["color0"][chunk], data["color1"][chunk], data["bits"][chunk] = encodeColors(blocks[chunk, :, :3], quality)
+    return data.tobytes()
+
+
+def mipChain(pixels):
+    """ the image followed by its halved versions down to 1x1, 2x2 box filtered """
+    levels = [pixels]
+    while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+        height, width = pixels.shape[:2]
+        padded = numpy.pad(pixels, ((0, height % 2), (0, width % 2), (0, 0)), mode="edge").astype(numpy.uint16)
+        pixels = ((padded[0::2, 0::2] + padded[1::2, 0::2] + padded[0::2, 1::2] + padded[1::2, 1::2] + 2) // 4).astype(numpy.uint8)
+        levels.append(pixels)
+    return levels
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+A writer for KTX (version 1) files holding the unchanged DXT blocks of a DDS
+
+The KTX file format is described at:
+ https://www.khronos.org/opengles/sdk/tools/KTX/file_format_spec/
+
+The GL formats are the ones of WEBGL_compressed_texture_s3tc, clients upload
+the mip levels as they are without decoding a single pixel.
+"""
+
+from struct import pack
+
+
+KTX_IDENTIFIER = b"\xabKTX 11\xbb\r\n\x1a\n"
+KTX_ENDIANNESS = 0x04030201
+
+# glBaseInternalFormat
+GL_RGB  = 0x1907
+GL_RGBA = 0x1908
+
+# glInternalFormat
+COMPRESSED_RGB_S3TC_DXT1_EXT  = 0x83F0
+COMPRESSED_RGBA_S3TC_DXT1_EXT = 0x83F1
+COMPRESSED_RGBA_S3TC_DXT3_EXT = 0x83F2
+COMPRESSED_RGBA_S3TC_DXT5_EXT = 0x83F3
+
+# (fourCC, mode) -> (glInternalFormat, glBaseInternalFormat)
+GL_FORMATS = {
+    (b"DXT1", "RGB"):  (COMPRESSED_RGB_S3TC_DXT1_EXT, GL_RGB),
+    (b"DXT1", "RGBA"): (COMPRESSED_RGBA_S3TC_DXT1_EXT, GL_RGBA),
+    (b"DXT3", "RGBA"): (COMPRESSED_RGBA_S3TC_DXT3_EXT, GL_RGBA),
+    (b"DXT5", "RGBA"): (COMPRESSED_RGBA_S3TC_DXT5_EXT, GL_RGBA),
+}
+
+
+def saveKTX(im, fp, maxSize=None):
+    """
+    Copy the mip levels of the DDS image im to fp. Levels larger than maxSize
+    are left out, the smallest level is always written. A chain that doesn't
+    reach 1x1 is incomplete for GL mip map filtering, then only its largest
+    level is written.
+    """
+    levels = im.mipLevels()
+    while maxSize and len(levels) > 1 and max(levels[0][1]) > maxSize:
+        levels = levels[1:]
+    if levels[-1][1] != (1, 1):
+        levels = levels[:1]
+
+    data = []
+    for offset, size in levels:
+        length = im.mipLevelSize(size)
+        im.fp.seek(offset)
+        data.append(im.fp.read(length))
+        if len(data[-1]) != length:
+            raise ValueError("Truncated mip level %dx%d" % size)
+    writeKTX(fp, im.fourCC, im.mode, levels[0][1], data)
+
+
+def writeKTX(fp, fourCC, mode, size, levels):
+    """ write the blocks of all mip levels, largest first, of a size[0] x size[1] texture """
+    try:
+        glInternalFormat, glBaseInternalFormat = GL_FORMATS[fourCC, mode]
+    except KeyError:
+        raise ValueError("No compressed GL format for %s %s" % (fourCC, mode))
+
+    fp.write(KTX_IDENTIFIER)
+    fp.write(pack("<13I",
+        KTX_ENDIANNESS,
+        0,                      # glType, 0 for compressed data
+        1,                      # glTypeSize
+        0,                      # glFormat, 0 for compressed data
+        glInternalFormat,
+        glBaseInternalFormat,
+        size[0],
+        size[1],
+        0,                      # pixelDepth
+        0,                      # numberOfArrayElements
+        1,                      # numberOfFaces
+        len(levels),            # numberOfMipmapLevels
+        0,                      # bytesOfKeyValueData
+    ))
+
+    for data in levels:
+        # DXT levels are whole 8 or 16 byte blocks, no mipPadding needed
+        fp.write(pack("<I", len(data)))
+        fp.write(data)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+A minimal writer for binary glTF 2.0 (.glb) files
+
+The format is described at:
+ https://github.com/KhronosGroup/glTF/tree/master/specification/2.0
+
+Everything goes into a single binary buffer: vertex data is written straight
+from the decoded numpy arrays, images are embedded as they are.
+"""
+
+import json
+import struct
+
+import numpy
+
+
+# accessor.componentType
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT   = 5125
+FLOAT          = 5126
+
+# bufferView.target
+ARRAY_BUFFER         = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# primitive.mode
+TRIANGLES = 4
+
+COMPONENT_TYPES = {
+    numpy.dtype("<u2"): UNSIGNED_SHORT,
+    numpy.dtype("<u4"): UNSIGNED_INT,
+    numpy.dtype("<f4"): FLOAT,
+}
+
+ACCESSOR_TYPES = {
+    1: "SCALAR",
+    2: "VEC2",
+    3: "VEC3",
+    4: "VEC4",
+}
+
+GLB_MAGIC   = b"glTF"
+GLB_VERSION = 2
+CHUNK_JSON  = b"JSON"
+CHUNK_BIN   = b"BIN\0"
+
+
+class GltfBuilder(object):
+
+    def __init__(self, generator="w3dconverter"):
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": generator},
+            "scene": 0,
+            "scenes": [{"nodes": []}],
+        }
+        self._data = []     # pieces of the binary buffer
+        self._length = 0
+        self._refs = {}
+
+    def ref(self, key, factory):
+        """ index of the item added for key, factory() adds it on first use """
+        try:
+            return self._refs[key]
+        except KeyError:
+            index = self._refs[key] = factory()
+            return index
+
+    def add(self, kind, item):
+        items = self.gltf.setdefault(kind, [])
+        items.append(item)
+        return len(items) - 1
+
+    def add_root(self, node):
+        self.gltf["scenes"][0]["nodes"].append(node)
+
+    def add_buffer_view(self, data, target=None):
+        data = memoryview(data).cast("B")
+        padding = -self._length % 4  # accessors need aligned offsets
+        if padding:
+            self._data.append(b"\0" * padding)
+            self._length += padding
+        view = {
+            "buffer": 0,
+            "byteOffset": self._length,
+            "byteLength": len(data),
+        }
+        if target is not None:
+            view["target"] = target
+        self._data.append(data)
+        self._length += len(data)
+        return self.add("bufferViews", view)
+
+    def add_accessor(self, array, target=ARRAY_BUFFER, bounds=False):
+        array = numpy.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        accessor = {
+            "bufferView": self.add_buffer_view(array, target),
+            "componentType": COMPONENT_TYPES[array.dtype],
+            "count": len(array),
+            "type": ACCESSOR_TYPES[array.shape[1] if array.ndim > 1 else 1],
+        }
+        if bounds:  # required for POSITION
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        return self.add("accessors", accessor)
+
+    def add_image(self, data, mimeType, name=None):
+        image = {
+            "bufferView": self.add_buffer_view(data),
+            "mimeType": mimeType,
+        }
+        if name:
+            image["name"] = name
+        return self.add("images", image)
+
+    def to_glb(self):
+        binary = b"".join(self._data)
+        binary += b"\0" * (-len(binary) % 4)
+        if binary:
+            self.gltf["buffers"] = [{"byteLength": len(binary)}]
+
+        text = json.dumps(self.gltf, separators=(",", ":")).encode("utf-8")
+        text += b" " * (-len(text) % 4)
+
+        chunks = [struct.pack("<L4s", len(text), CHUNK_JSON), text]
+        if binary:
+            chunks += [struct.pack("<L4s", len(binary), CHUNK_BIN), binary]
+        length = 12 + sum(len(chunk) for chunk in chunks)
+        return b"".join([struct.pack("<4sLL", GLB_MAGIC, GLB_VERSION, length)] + chunks)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming JSON writer
+
+Documents are written piece by piece to a file object instead of being built
+as one string first. Containers can be opened, filled one item at a time and
+closed again, so only the item currently written has to be in memory.
+
+Compact mode drops all whitespace and prints floats in their shortest
+round-trip form. Floats of float32 data (Float32, Float32List or float32
+arrays and scalars) round trip as float32 (0.3 instead of 0.30000001192092896), all others as doubles.
+Precision rounds the floats below the given keys to a number of decimals.
+"""
+
+import json
+
+import numpy
+
+
+# json's spelling of non finite floats
+NONFINITE = {
+    "nan": "NaN",
+    "inf": "Infinity",
+    "-inf": "-Infinity",
+}
+
+
+class Float32(float):
+    """ a float that comes from float32 data, like the floats read from a file """
+
+class Float32List(list):
+    """ a list of floats that come from float32 data, like vertex attributes """
+
+
+class JsonWriter(object):
+
+    def __init__(self, fp, indent=None, compact=False, precision=None):
+        self.fp = fp
+        self.indent = None if compact else indent
+        self.compact = compact
+        self.precision = precision or {}    # key -> decimals for all floats below that key
+        self.item_separator = "," if compact or indent is not None else ", "
+        self.key_separator = ":" if compact else ": "
+        self._stack = []    # open containers: [closing bracket, items written, decimals]
+
+    def _newline(self, level):
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def _next(self, key):
+        """
+        separator (and key) in front of the next item of the open container,
+        returns the decimals that apply to the item
+        """
+        if not self._stack:
+            return self.precision.get(key)
+        container = self._stack[-1]
+        prefix = self.item_separator if container[1] else ""
+        prefix += self._newline(len(self._stack))
+        if container[0] == "}":
+            prefix += json.dumps(str(key)) + self.key_separator
+        container[1] += 1
+        self.fp.write(prefix)
+        return self.precision.get(key, container[2])
+
+    def begin_object(self, key=None):
+        digits = self._next(key)
+        self.fp.write("{")
+        self._stack.append(["}", 0, digits])
+
+    def begin_array(self, key=None):
+        digits = self._next(key)
+        self.fp.write("[")
+        self._stack.append(["]", 0, digits])
+
+    def end(self):
+        bracket, count, digits = self._stack.pop()
+        if count:
+            self.fp.write(self._newline(len(self._stack)))
+        self.fp.write(bracket)
+        if not self._stack and self.indent is not None:
+            self.fp.write("\n")
+
+    def write(self, value, key=None):
+        """ write a complete value, key is required inside objects """
+        digits = self._next(key)
+        for chunk in self._encode(value, len(self._stack), digits):
+            self.fp.write(chunk)
+
+    def _encode(self, value, level, digits=None):
+        if isinstance(value, numpy.ndarray):
+            if value.dtype == numpy.float32 and value.ndim == 1:
+                value = Float32List(value.tolist())
+            elif value.ndim > 1:
+                value = list(value)
+            else:
+                value = value.tolist()
+        elif isinstance(value, numpy.float32):
+            value = Float32(value)
+        elif isinstance(value, numpy.generic):
+            value = value.item()
+
+        if isinstance(value, dict):
+            if not value:
+                yield "{}"
+                return
+            separator = "{"
+            for key, item in value.items():
+                yield separator + self._newline(level + 1) + json.dumps(str(key)) + self.key_separator
+                for chunk in self._encode(item, level + 1, self.precision.get(key, digits)):
+                    yield chunk
+                separator = self.item_separator
+            yield self._newline(level) + "}"
+
+        elif isinstance(value, (list, tuple)):
+            if not value:
+                yield "[]"
+                return
+            numbers = self._numbers(value, digits, isinstance(value, Float32List))
+            if numbers is not None:
+                separator = self.item_separator + self._newline(level + 1)
+                yield "[" + self._newline(level + 1) + separator.join(numbers) + self._newline(level) + "]"
+                return
+            separator = "["
+            for item in value:
+                yield separator + self._newline(level + 1)
+                for chunk in self._encode(item, level + 1, digits):
+                    yield chunk
+                separator = self.item_separator
+            yield self._newline(level) + "]"
+
+        elif type(value) in (float, Float32) and (self.compact or digits is not None):
+            yield self._floats([value], digits, type(value) is Float32)[0]
+
+        elif type(value) is Float32:
+            yield json.dumps(float(value))
+
+        else:
+            yield json.dumps(value)
+
+    def _numbers(self, values, digits=None, float32=False):
+        """
+        flat lists of plain ints/floats (the bulk of the data) are formatted in
+        one go, ints stay ints
+        """
+        floats = []
+        for index, value in enumerate(values):
+            kind = type(value)
+            if kind is float:
+                floats.append(index)
+            elif kind is not int:
+                return None
+        if floats and (self.compact or digits is not None):
+            if len(floats) == len(values):
+                return self._floats(values, digits, float32)
+            numbers = list(map(repr, values))
+            for index, number in zip(floats, self._floats([ values[index] for index in floats ], digits, float32)):
+                numbers[index] = number
+            return numbers
+        numbers = list(map(repr, values))
+        if any("n" in number for number in numbers):  # nan/inf need json's spelling
+            numbers = [ json.dumps(value) for value in values ]
+        return numbers
+
+    def _floats(self, values, digits, float32=False):
+        if digits is not None:
+            numbers = numpy.round(numpy.asarray(values, dtype=numpy.float64), digits)
+        else:
+            # the shortest form that round-trips in the precision the floats came from
+            numbers = numpy.asarray(values, dtype=numpy.float32 if float32 else numpy.float64)
+        numbers = numbers.astype(str).tolist()
+        if self.compact:
+            numbers = [ number[:-2] if number.endswith(".0") else number for number in numbers ]
+        if any("n" in number for number in numbers):
+            numbers = [ NONFINITE.get(number, number) for number in numbers ]
+        return numbers
@@ -1,6 +1,8 @@
 import sys
+import mmap
 import struct
-from mathutils import Vector, Quaternion
+import numpy
+from .vecmath import Vector3, Quaternion
 from . import struct_w3d
 
 
@@ -8,97 +10,247 @@ import logging
 logger = logging.getLogger("reader.w3d")
 
 
+#######################################################################################
+# Reader backend
+#######################################################################################
+
+class ChunkReader(object):
+    """
+    File-like reader over an in-memory buffer (bytes, bytearray, memoryview or a
+    read-only mmap of the file). read/tell/seek are plain offset arithmetic, so
+    walking the chunks costs no syscalls.
+    """
+
+    def __init__(self, data):
+        self._mmap = data if isinstance(data, mmap.mmap) else None
+        self._view = memoryview(data).cast("B")
+        self.size = len(self._view)
+        self.pos = 0
+
+    @classmethod
+    def from_file(Cls, path):
+        with open(path, "rb") as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files can't be mapped
+                data = b""
+        return Cls(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views handed out by view() are still alive, the mapping is
+                # closed when the last of them is collected
+                pass
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = offset
+        return offset
+
+    def read(self, size=-1):
+        start = self.pos
+        end = self.size if size < 0 else min(start + size, self.size)
+        self.pos = end
+        return self._view[start:end].tobytes()
+
+    def read_cstring(self):
+        """ bytes up to the next NUL, the NUL itself is consumed """
+        start = self.pos
+        end = start
+        view = self._view
+        while end < self.size and view[end]:
+            end += 1
+        self.pos = end + 1
+        return view[start:end].tobytes()
+
+    def view(self, size):
+        """ zero-copy memoryview of the next size bytes """
+        start = self.pos
+        self.pos = start + size
+        return self._view[start:self.pos]
+
+    def unpack(self, fmt):
+        """ unpack a precompiled struct.Struct at the current position """
+        values = fmt.unpack_from(self._view, self.pos)
+        self.pos += fmt.size
+        return values
+
+
 #######################################################################################
 # Basic Methods
 #######################################################################################
 
+_LONG = struct.Struct("<L")
+_SHORT = struct.Struct("<H")
+_SIGNED_SHORT = struct.Struct("<h")
+_FLOAT = struct.Struct("<f")
+_SIGNED_BYTE = struct.Struct("<b")
+_UNSIGNED_BYTE = struct.Struct("<B")
+_RGBA = struct.Struct("<4B")
+_VECTOR = struct.Struct("<3f")
+_QUATERNION = struct.Struct("<4f")
+_COMPRESSED_QUATERNION = struct.Struct("<4b")
+
+# fixed layout records, decoded with a single unpack each
+_MESH_HEADER = struct.Struct("<LL16s16s9L3f3f3ff")
+_HIERARCHY_HEADER = struct.Struct("<L16sL3f")
+_PIVOT = struct.Struct("<16sL3f3f4f")
+_HLOD_SUB_OBJECT = struct.Struct("<L32s")
+_BOX = struct.Struct("<LL32s4B3f3f")
+_VERTEX_MATERIAL = struct.Struct("<L4B4B4B4B3f")
+_SHADER = struct.Struct("<16B")
+
 def ReadString(file):
-    bytes = []
-    b = file.read(1)
-    while ord(b)!=0:
-        bytes.append(b)
-        b = file.read(1)
-    return (b"".join(bytes)).decode("utf-8")
+    return file.read_cstring().decode("utf-8")
+
+def FixedString(data):
+    return data.split(b"\0", 1)[0].decode("utf-8", "replace")
 
 def ReadFixedString(file):
-    SplitString = ((str(file.read(16)))[2:18]).split("\\")
-    return SplitString[0]
+    return FixedString(file.read(16))
 
 def ReadLongFixedString(file):
-    SplitString = ((str(file.read(32)))[2:34]).split("\\")
-    return SplitString[0]
+    return FixedString(file.read(32))
 
 def ReadRGBA(file):
-    return struct_w3d.RGBA(r=ord(file.read(1)), g=ord(file.read(1)), b=ord(file.read(1)), a=ord(file.read(1)))
+    r, g, b, a = file.unpack(_RGBA)
+    return struct_w3d.RGBA(r=r, g=g, b=b, a=a)
+
+def ReadRecords(file, fmt, chunkEnd):
+    """ all whole records of a precompiled struct.Struct up to chunkEnd """
+    data = file.view((chunkEnd - file.tell()) // fmt.size * fmt.size)
+    file.seek(chunkEnd)
+    return fmt.iter_unpack(data)
 
 def GetChunkSize(data):
     return (data & 0x7FFFFFFF)
 
 def ReadLong(file):
     #binary_format = "<l" long
-    return (struct.unpack("<L", file.read(4))[0])
+    return file.unpack(_LONG)[0]
 
 def ReadShort(file):
     #binary_format = "<h" short
-    return (struct.unpack("<H", file.read(2))[0])
+    return file.unpack(_SHORT)[0]
 
 def ReadUnsignedShort(file):
-    return (struct.unpack("<h", file.read(2))[0])
+    return file.unpack(_SIGNED_SHORT)[0]
 
 def ReadLongArray(file,chunkEnd):
-    LongArray = []
-    while file.tell() < chunkEnd:
-        LongArray.append(ReadLong(file))
-    return LongArray
+    count = (chunkEnd - file.tell()) // 4
+    return list(file.unpack(struct.Struct("<%dL" % count)))
 
 def ReadFloat(file):
     #binary_format = "<f" float
-    return (struct.unpack("f", file.read(4))[0])
+    return file.unpack(_FLOAT)[0]
 
 def ReadSignedByte(file):
-    return (struct.unpack("<b", file.read(1))[0])
+    return file.unpack(_SIGNED_BYTE)[0]
 
 def ReadUnsignedByte(file):
-    return (struct.unpack("<B", file.read(1))[0])
+    return file.unpack(_UNSIGNED_BYTE)[0]
 
 def ReadVector(file):
-    return Vector((ReadFloat(file), ReadFloat(file), ReadFloat(file)))
+    return Vector3(file.unpack(_VECTOR))
 
 def ReadQuaternion(file):
-    quat = (ReadFloat(file), ReadFloat(file), ReadFloat(file), ReadFloat(file))
+    x, y, z, w = file.unpack(_QUATERNION)
     #change order from xyzw to wxyz
-    return Quaternion((quat[3], quat[0], quat[1], quat[2]))
+    return Quaternion((w, x, y, z))
 
 def ReadCompressedQuaternion(file, faktor):
-    quat = (ReadSignedByte(file) / faktor, ReadSignedByte(file) / faktor, ReadSignedByte(file) / faktor, ReadSignedByte(file) / faktor)
+    x, y, z, w = file.unpack(_COMPRESSED_QUATERNION)
     #change order from xyzw to wxyz
-    return Quaternion((quat[3], quat[0], quat[1], quat[2]))
+    return Quaternion((w / faktor, x / faktor, y / faktor, z / faktor))
 
 def GetVersion(data):
     return struct_w3d.Version(major = (data)>>16, minor = (data) & 0xFFFF)
 
+#######################################################################################
+# Chunk index
+#######################################################################################
+
+class Chunk(object):
+    """ table of contents entry: type, payload offset and payload size of a chunk """
+    __slots__ = ("type", "offset", "size", "children")
+
+    def __init__(self, type, offset, size, children=()):
+        self.type = type
+        self.offset = offset
+        self.size = size
+        self.children = children
+
+    def __repr__(self):
+        return "<Chunk %s @%s+%s>" % (self.type, self.offset, self.size)
+
+    @property
+    def end(self):
+        return self.offset + self.size
+
+    def find(self, type):
+        for chunk in self.children:
+            if chunk.type == type:
+                return chunk
+        return None
+
+    def findall(self, type):
+        return [ chunk for chunk in self.children if chunk.type == type ]
+
+def ScanChunks(file, chunkEnd):
+    """
+    Build the chunk tree up to chunkEnd. Only chunk headers are read, payloads
+    are seeked past. Container chunks are the ones in CHUNK_SCHEMAS.
+    """
+    chunks = []
+    while file.tell() + 8 <= chunkEnd:
+        chunk = Chunk(ReadLong(file), 0, GetChunkSize(ReadLong(file)))
+        chunk.offset = file.tell()
+        if chunk.end > chunkEnd:
+            logger.error("truncated chunk %s at %s" % (chunk.type, chunk.offset))
+            break
+        if chunk.type in CONTAINER_CHUNKS:
+            chunk.children = ScanChunks(file, chunk.end)
+        file.seek(chunk.end)
+        chunks.append(chunk)
+    file.seek(chunkEnd)
+    return chunks
+
 #######################################################################################
 # Hierarchy
 #######################################################################################
 
 def ReadHierarchyHeader(file):
-    HierarchyHeader = struct_w3d.HierarchyHeader()
-    HierarchyHeader.version = GetVersion(ReadLong(file))
-    HierarchyHeader.name = ReadFixedString(file)
-    HierarchyHeader.pivotCount = ReadLong(file)
-    HierarchyHeader.centerPos = ReadVector(file)
-    return HierarchyHeader
+    values = file.unpack(_HIERARCHY_HEADER)
+    return struct_w3d.HierarchyHeader(version = GetVersion(values[0]), name = FixedString(values[1]),
+        pivotCount = values[2], centerPos = Vector3(values[3:6]))
 
 def ReadPivots(file, chunkEnd):
     pivots = []
-    while file.tell() < chunkEnd:
-        pivot = struct_w3d.HierarchyPivot()
-        pivot.name = ReadFixedString(file)
-        pivot.parentID = ReadLong(file)
-        pivot.position = ReadVector(file)
-        pivot.eulerAngles = ReadVector(file)
-        pivot.rotation = ReadQuaternion(file)
-        pivots.append(pivot)
+    for values in ReadRecords(file, _PIVOT, chunkEnd):
+        x, y, z, w = values[8:12]
+        pivots.append(struct_w3d.HierarchyPivot(name = FixedString(values[0]), parentID = values[1],
+            position = Vector3(values[2:5]), eulerAngles = Vector3(values[5:8]),
+            #change order from xyzw to wxyz
+            rotation = Quaternion((w, x, y, z))))
     return pivots
 
 # if the exported pivots are corrupted these fixups are used
@@ -110,27 +262,7 @@ def ReadPivotFixups(file, chunkEnd):
     return pivot_fixups
 
 def ReadHierarchy(file, chunkEnd):
-    #print("\n### NEW HIERARCHY: ###")
-    HierarchyHeader = struct_w3d.HierarchyHeader()
-    Pivots = []
-    Pivot_fixups = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 257:
-            HierarchyHeader = ReadHierarchyHeader(file)
-            #print("Header")
-        elif chunkType == 258:
-            Pivots = ReadPivots(file, subChunkEnd)
-            #print("Pivots")
-        elif chunkType == 259:
-            Pivot_fixups = ReadPivotFixups(file, subChunkEnd)
-            #print("PivotFixups")
-        else:
-            logger.error("unknown chunktype in Hierarchy: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.Hierarchy(header = HierarchyHeader, pivots = Pivots, pivot_fixups = Pivot_fixups)
+    return ReadChunks(file, chunkEnd, 256)
 
 #######################################################################################
 # Animation
@@ -157,27 +289,12 @@ def ReadAnimationChannel(file, chunkEnd):
             Data.append(ReadQuaternion(file))
     else:
         logger.error("!!!unsupported vector len %s" % VectorLen)
-        while file.tell() < chunkEnd:
-            file.read(1)
+        file.seek(chunkEnd)
     return struct_w3d.AnimationChannel(firstFrame = FirstFrame, lastFrame = LastFrame, vectorLen = VectorLen,
         type = Type, pivot = Pivot, pad = Pad, data = Data)
 
 def ReadAnimation(file, chunkEnd):
-#    print("\n### NEW ANIMATION: ###")
-    Header = struct_w3d.AnimationHeader()
-    Channels = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 513:
-            Header = ReadAnimationHeader(file)
-        elif chunkType == 514:
-            Channels.append(ReadAnimationChannel(file, subChunkEnd))
-        else:
-            logger.error("unknown chunktype in Animation: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.Animation(header = Header, channels = Channels)
+    return ReadChunks(file, chunkEnd, 512)
 
 
 def ReadCompressedAnimationHeader(file):
@@ -274,41 +391,13 @@ def ReadTimeCodedAnimationVector(file, chunkEnd):
     #        while file.tell() < chunkEnd: # 25:16 59:42 (93:66 93:75) 110:90
     #            file.read(1)
 
-    while file.tell() < chunkEnd:
-            file.read(1)
+    file.seek(chunkEnd)
 
     #return struct_w3d.TimeCodedAnimationVector(magicNum = CompressionType, vectorLen = VectorLen, type = Type,
     #   timeCodesCount = TimeCodesCount, pivot = Pivot, timeCodedKeys = TimeCodedKeys)
 
 def ReadCompressedAnimation(file, chunkEnd):
-    print("\n### NEW COMPRESSED ANIMATION: ###")
-    Header = struct_w3d.CompressedAnimationHeader()
-    Channels = []
-    Vectors = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 641:
-            Header = ReadCompressedAnimationHeader(file)
-            print("#### numFrames %s" % Header.numFrames)
-            print("##Flavor %s" % Header.flavor)
-        elif chunkType == 642:
-            Channels.append(ReadTimeCodedAnimationChannel(file, subChunkEnd))
-        elif chunkType == 643:
-            #print("### size: %s" % chunkSize)
-            #ReadTimeCodedBitChannel(file, subChunkEnd)
-            print("not implemented yet")
-            file.seek(chunkSize, 1)
-        elif chunkType == 644:
-            #print("####size %s" % (chunkSize - 8))
-            #Vectors.append(ReadTimeCodedAnimationVector(file, subChunkEnd))
-            print("not implemented yet")
-            file.seek(chunkSize, 1)
-        else:
-            logger.error("unknown chunktype in CompressedAnimation: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.CompressedAnimation(header = Header, channels = Channels, vectors = Vectors)
+    return ReadChunks(file, chunkEnd, 640)
 
 #######################################################################################
 # HLod
@@ -329,45 +418,14 @@ def ReadHLodArrayHeader(file):
     return HLodArrayHeader
 
 def ReadHLodSubObject(file):
-    HLodSubObject = struct_w3d.HLodSubObject()
-    HLodSubObject.boneIndex = ReadLong(file)
-    HLodSubObject.name = ReadLongFixedString(file)
-    return HLodSubObject
+    boneIndex, name = file.unpack(_HLOD_SUB_OBJECT)
+    return struct_w3d.HLodSubObject(boneIndex = boneIndex, name = FixedString(name))
 
 def ReadHLodArray(file, chunkEnd):
-    HLodArrayHeader = struct_w3d.HLodArrayHeader()
-    HLodSubObjects = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 1795:
-            HLodArrayHeader = ReadHLodArrayHeader(file)
-        elif chunkType == 1796:
-            HLodSubObjects.append(ReadHLodSubObject(file))
-        else:
-            logger.error("unknown chunktype in HLodArray: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.HLodArray(header = HLodArrayHeader, subObjects = HLodSubObjects)
+    return ReadChunks(file, chunkEnd, 1794)
 
 def ReadHLod(file, chunkEnd):
-    #print("\n### NEW HLOD: ###")
-    HLodHeader = struct_w3d.HLodHeader()
-    HLodArray = struct_w3d.HLodArray()
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 1793:
-            HLodHeader = ReadHLodHeader(file)
-            #print("Header")
-        elif chunkType == 1794:
-            HLodArray = ReadHLodArray(file, subChunkEnd)
-            #print("HLodArray")
-        else:
-            logger.error("unknown chunktype in HLod: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.HLod(header = HLodHeader, lodArray = HLodArray)
+    return ReadChunks(file, chunkEnd, 1792)
 
 #######################################################################################
 # Box
@@ -375,46 +433,23 @@ def ReadHLod(file, chunkEnd):
 
 def ReadBox(file):
     #print("\n### NEW BOX: ###")
-    version = GetVersion(ReadLong(file))
-    attributes = ReadLong(file)
-    name = ReadLongFixedString(file)
-    color = ReadRGBA(file)
-    center = ReadVector(file)
-    extend = ReadVector(file)
-    return struct_w3d.Box(version = version, attributes = attributes, name = name, color = color, center = center, extend = extend)
+    values = file.unpack(_BOX)
+    return struct_w3d.Box(version = GetVersion(values[0]), attributes = values[1], name = FixedString(values[2]),
+        color = struct_w3d.RGBA(*values[3:7]), center = Vector3(values[7:10]), extend = Vector3(values[10:13]))
 
 #######################################################################################
 # Texture
 #######################################################################################
 
+def ReadTextureInfo(file):
+    return struct_w3d.TextureInfo(attributes = ReadShort(file),
+        animType = ReadShort(file), frameCount = ReadLong(file), frameRate = ReadFloat(file))
+
 def ReadTexture(file, chunkEnd):
-    tex = struct_w3d.Texture()
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-        if Chunktype == 50:
-            tex.name = ReadString(file)
-        elif Chunktype == 51:
-            tex.textureInfo = struct_w3d.TextureInfo(attributes = ReadShort(file),
-                animType = ReadShort(file), frameCount = ReadLong(file), frameRate = ReadFloat(file))
-        else:
-            logger.error("unknown chunktype in Texture: %s" % chunkType)
-            file.seek(Chunksize,1)
-    return tex
+    return ReadChunks(file, chunkEnd, 49)
 
 def ReadTextureArray(file, chunkEnd):
-    textures = []
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-        if Chunktype == 49:
-            textures.append(ReadTexture(file, subChunkEnd))
-        else:
-            logger.error("unknown chunktype in TextureArray: %s" % chunkType)
-            file.seek(Chunksize, 1)
-    return textures
+    return ReadChunks(file, chunkEnd, 48)
 
 #######################################################################################
 # Material
@@ -427,91 +462,27 @@ def ReadMeshTextureCoordArray(file, chunkEnd):
     return txCoords
 
 def ReadMeshTextureStage(file, chunkEnd):
-    TextureIds = []
-    TextureCoords = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 73:
-            TextureIds = ReadLongArray(file, subChunkEnd)
-        elif chunkType == 74:
-            TextureCoords = ReadMeshTextureCoordArray(file, subChunkEnd)
-        else:
-            logger.error("unknown chunktype in MeshTextureStage: %s" % chunkType)
-            file.seek(chunkSize,1)
-    return struct_w3d.MeshTextureStage(txIds = TextureIds, txCoords = TextureCoords)
+    return ReadChunks(file, chunkEnd, 72)
+
+def ReadRGBAArray(file, chunkEnd):
+    return [ struct_w3d.RGBA(*values) for values in ReadRecords(file, _RGBA, chunkEnd) ]
 
 def ReadMeshMaterialPass(file, chunkEnd):
     # got two different types of material passes depending on if the mesh has bump maps of not
-    VertexMaterialIds = []
-    ShaderIds = []
-    DCG =  []
-    TextureStage = struct_w3d.MeshTextureStage()
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 57: #Vertex Material Ids
-            VertexMaterialIds = ReadLongArray(file, subChunkEnd)
-        elif chunkType == 58:#Shader Ids
-            ShaderIds = ReadLongArray(file, subChunkEnd)
-        elif chunkType == 59:#vertex colors
-            while file.tell() < subChunkEnd:
-                DCG.append(ReadRGBA(file))
-        elif chunkType == 63:# dont know what this is -> size is always 4 and value 0
-            #print("<<< unknown Chunk 63 >>>")
-            file.seek(chunkSize, 1)
-        elif chunkType == 72: #Texture Stage
-            TextureStage = ReadMeshTextureStage(file, subChunkEnd)
-        elif chunkType == 74: #Texture Coords
-            TextureStage.txCoords = ReadMeshTextureCoordArray(file, subChunkEnd)
-        else:
-            logger.error("unknown chunktype in MeshMaterialPass: %s" % chunkType)
-            file.seek(chunkSize, 1)
-    return struct_w3d.MeshMaterialPass(vmIds = VertexMaterialIds, shaderIds = ShaderIds, dcg = DCG, txStage = TextureStage)
+    return ReadChunks(file, chunkEnd, 56)
+
+def ReadVertexMaterial(file):
+    values = file.unpack(_VERTEX_MATERIAL)
+    return struct_w3d.VertexMaterial(attributes = values[0],
+        ambient = struct_w3d.RGBA(*values[1:5]), diffuse = struct_w3d.RGBA(*values[5:9]),
+        specular = struct_w3d.RGBA(*values[9:13]), emissive = struct_w3d.RGBA(*values[13:17]),
+        shininess = values[17], opacity = values[18], translucency = values[19])
 
 def ReadMaterial(file, chunkEnd):
-    mat = struct_w3d.MeshMaterial()
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + chunkSize
-        if chunkType == 44:
-            mat.vmName = ReadString(file)
-        elif chunkType == 45:
-            vmInf = struct_w3d.VertexMaterial()
-            vmInf.attributes = ReadLong(file)
-            vmInf.ambient = ReadRGBA(file)
-            vmInf.diffuse = ReadRGBA(file)
-            vmInf.specular = ReadRGBA(file)
-            vmInf.emissive = ReadRGBA(file)
-            vmInf.shininess = ReadFloat(file)
-            vmInf.opacity = ReadFloat(file)
-            vmInf.translucency = ReadFloat(file)
-            mat.vmInfo = vmInf
-        elif chunkType == 46:
-            mat.vmArgs0 = ReadString(file)
-        elif chunkType == 47:
-            mat.vmArgs1 = ReadString(file)
-        else:
-            logger.error("unknown chunktype in Material: %s" % chunkType)
-            file.seek(chunkSize,1)
-    return mat
+    return ReadChunks(file, chunkEnd, 43)
 
 def ReadMeshMaterialArray(file, chunkEnd):
-    Mats = []
-    while file.tell() < chunkEnd:
-        chunkType = ReadLong(file)
-        chunkSize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell()+chunkSize
-        if chunkType == 43:
-            Mats.append(ReadMaterial(file, subChunkEnd))
-        else:
-            logger.error("unknown chunktype in MeshMaterialArray: %s" % chunkType)
-            print("!!!unknown chunktype in MeshMaterialArray: %s" % chunkType)
-            file.seek(chunkSize,1)
-    return Mats
+    return ReadChunks(file, chunkEnd, 42)
 
 def ReadMeshMaterialSetInfo (file):
     result = struct_w3d.MeshMaterialSetInfo(passCount = ReadLong(file), vertMatlCount = ReadLong(file),
@@ -523,10 +494,10 @@ def ReadMeshMaterialSetInfo (file):
 #######################################################################################
 
 def ReadMeshVerticesArray(file, chunkEnd):
-    verts = []
-    while file.tell() < chunkEnd:
-        verts.append(ReadVector(file))
-    return verts
+    # whole chunk in one go: (N, 3) float32, copied out of the file buffer
+    data = file.view((chunkEnd - file.tell()) // 12 * 12)
+    file.seek(chunkEnd)
+    return numpy.frombuffer(data, dtype="<f4").reshape(-1, 3).astype(numpy.float32)
 
 def ReadMeshVertexInfluences(file, chunkEnd):
     vertInfs = []
@@ -543,45 +514,20 @@ def ReadMeshVertexInfluences(file, chunkEnd):
 # Faces
 #######################################################################################
 
-def ReadMeshFace(file):
-    result = struct_w3d.MeshFace(vertIds = (ReadLong(file), ReadLong(file), ReadLong(file)),
-    attrs = ReadLong(file),
-    normal = ReadVector(file),
-    distance = ReadFloat(file))
-    return result
-
 def ReadMeshFaceArray(file, chunkEnd):
-    faces = []
-    while file.tell() < chunkEnd:
-        faces.append(ReadMeshFace(file))
-    return faces
+    # whole chunk as one structured array, see struct_w3d.MESH_FACE_DTYPE
+    dtype = struct_w3d.MESH_FACE_DTYPE
+    data = file.view((chunkEnd - file.tell()) // dtype.itemsize * dtype.itemsize)
+    file.seek(chunkEnd)
+    return numpy.frombuffer(data, dtype=dtype).copy()
 
 #######################################################################################
 # Shader
 #######################################################################################
 
 def ReadMeshShaderArray(file, chunkEnd):
-    shaders = []
-    while file.tell() < chunkEnd:
-        shader = struct_w3d.MeshShader()
-        shader.depthCompare = ReadUnsignedByte(file)
-        shader.depthMask = ReadUnsignedByte(file)
-        shader.colorMask = ReadUnsignedByte(file)
-        shader.destBlend = ReadUnsignedByte(file)
-        shader.fogFunc = ReadUnsignedByte(file)
-        shader.priGradient = ReadUnsignedByte(file)
-        shader.secGradient = ReadUnsignedByte(file)
-        shader.srcBlend = ReadUnsignedByte(file)
-        shader.texturing = ReadUnsignedByte(file)
-        shader.detailColorFunc = ReadUnsignedByte(file)
-        shader.detailAlphaFunc = ReadUnsignedByte(file)
-        shader.shaderPreset = ReadUnsignedByte(file)
-        shader.alphaTest = ReadUnsignedByte(file)
-        shader.postDetailColorFunc = ReadUnsignedByte(file)
-        shader.postDetailAlphaFunc = ReadUnsignedByte(file)
-        shader.pad = ReadUnsignedByte(file)
-        shaders.append(shader)
-    return shaders
+    # the 16 bytes of a shader are the MeshShader fields in order
+    return [ struct_w3d.MeshShader(*values) for values in ReadRecords(file, _SHADER, chunkEnd) ]
 
 #######################################################################################
 # Bump Maps
@@ -618,38 +564,14 @@ def ReadNormalMapEntryStruct(file, chunkEnd, entryStruct):
         entryStruct.alphaTestEnable = ReadUnsignedByte(file)
     else:
         logger.error("unknown NormalMapEntryStruct: %s" % name)
-        while file.tell() < chunkEnd:
-            file.read(1)
+        file.seek(chunkEnd)
     return entryStruct
 
 def ReadNormalMap(file, chunkEnd):
-    Header = struct_w3d.MeshNormalMapHeader()
-    EntryStruct = struct_w3d.MeshNormalMapEntryStruct()
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-        if Chunktype == 82:
-            Header = ReadNormalMapHeader(file, subChunkEnd)
-        elif Chunktype == 83:
-            EntryStruct = ReadNormalMapEntryStruct(file, subChunkEnd, EntryStruct)
-        else:
-            logger.error("unknown chunktype in NormalMap: %s" % chunkType)
-            file.seek(Chunksize, 1)
-    return struct_w3d.MeshNormalMap(header = Header, entryStruct = EntryStruct)
+    return ReadChunks(file, chunkEnd, 81)
 
 def ReadBumpMapArray(file, chunkEnd):
-    NormalMap = struct_w3d.MeshNormalMap()
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-        if Chunktype == 81:
-            NormalMap = ReadNormalMap(file, subChunkEnd)
-        else:
-            logger.error("unknown chunktype in BumpMapArray: %s" % chunkType)
-            file.seek(Chunksize, 1)
-    return struct_w3d.MeshBumpMapArray(normalMap = NormalMap)
+    return ReadChunks(file, chunkEnd, 80)
 
 #######################################################################################
 # AABTree (Axis-aligned-bounding-box)
@@ -659,8 +581,7 @@ def ReadAABTreeHeader(file, chunkEnd):
     nodeCount = ReadLong(file)
     polyCount = ReadLong(file)
     #padding of the header
-    while file.tell() < chunkEnd:
-        file.read(4)
+    file.seek(chunkEnd)
     return struct_w3d.AABTreeHeader(nodeCount = nodeCount, polyCount = polyCount)
 
 def ReadAABTreePolyIndices(file, chunkEnd):
@@ -684,127 +605,265 @@ def ReadAABTreeNodes(file, chunkEnd):
 
 #Axis-Aligned-Bounding-Box tree
 def ReadAABTree(file, chunkEnd):
-    aabtree = struct_w3d.MeshAABTree()
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-        if Chunktype == 145:
-            aabtree.header = ReadAABTreeHeader(file, subChunkEnd)
-        elif Chunktype == 146:
-            aabtree.polyIndices = ReadAABTreePolyIndices(file, subChunkEnd)
-        elif Chunktype == 147:
-            aabtree.nodes = ReadAABTreeNodes(file, subChunkEnd)
-        else:
-            logger.error("unknown chunktype in AABTree: %s" % chunkType)
-            file.seek(Chunksize, 1)
-    return aabtree
+    return ReadChunks(file, chunkEnd, 144)
 
 #######################################################################################
 # Mesh
 #######################################################################################
 
 def ReadMeshHeader(file):
-    result = struct_w3d.MeshHeader(version = GetVersion(ReadLong(file)), attrs =  ReadLong(file), meshName = ReadFixedString(file),
-        containerName = ReadFixedString(file),faceCount = ReadLong(file),
-        vertCount = ReadLong(file), matlCount = ReadLong(file), damageStageCount = ReadLong(file), sortLevel = ReadLong(file),
-        prelitVersion = ReadLong(file), futureCount = ReadLong(file),
-        vertChannelCount = ReadLong(file), faceChannelCount = ReadLong(file),
+    values = file.unpack(_MESH_HEADER)
+    result = struct_w3d.MeshHeader(version = GetVersion(values[0]), attrs = values[1], meshName = FixedString(values[2]),
+        containerName = FixedString(values[3]), faceCount = values[4],
+        vertCount = values[5], matlCount = values[6], damageStageCount = values[7], sortLevel = values[8],
+        prelitVersion = values[9], futureCount = values[10],
+        vertChannelCount = values[11], faceChannelCount = values[12],
         #bounding volumes
-        minCorner = ReadVector(file),
-        maxCorner = ReadVector(file),
-        sphCenter = ReadVector(file),
-        sphRadius =  ReadFloat(file))
+        minCorner = Vector3(values[13:16]),
+        maxCorner = Vector3(values[16:19]),
+        sphCenter = Vector3(values[19:22]),
+        sphRadius = values[22])
     return result
 
 def ReadMesh(file, chunkEnd):
-    MeshVerticesInfs = []
-    MeshVertices = []
-    MeshVerticesCopy = []
-    MeshNormals = []
-    MeshNormalsCopy = []
-    MeshVerticeMats = []
-    MeshHeader = struct_w3d.MeshHeader()
-    MeshMaterialInfo = struct_w3d.MeshMaterialSetInfo()
-    MeshFaces = []
-    MeshMaterialPass = struct_w3d.MeshMaterialPass()
-    MeshShadeIds = []
-    MeshShaders = []
-    MeshTextures = []
-    MeshUsertext = ""
-    MeshBumpMaps = struct_w3d.MeshBumpMapArray()
-    MeshAABTree = struct_w3d.MeshAABTree()
-
-    #print("\n### NEW MESH: ###")
-    while file.tell() < chunkEnd:
-        Chunktype = ReadLong(file)
-        Chunksize = GetChunkSize(ReadLong(file))
-        subChunkEnd = file.tell() + Chunksize
-
-        if Chunktype == 2:
-            MeshVertices = ReadMeshVerticesArray(file, subChunkEnd)
-#            temp = 0
-        elif Chunktype == 3072:
-            MeshVerticesCopy = ReadMeshVerticesArray(file, subChunkEnd)
-
-        elif Chunktype == 3:
-            MeshNormals = ReadMeshVerticesArray(file, subChunkEnd)
-
-        elif Chunktype == 3073:
-            MeshNormalsCopy = ReadMeshVerticesArray(file, subChunkEnd)
-
-        elif Chunktype == 12:
-            MeshUsertext = ReadString(file)
-
-        elif Chunktype == 14:
-            MeshVerticesInfs = ReadMeshVertexInfluences(file, subChunkEnd)
-
-        elif Chunktype == 31:
-            MeshHeader = ReadMeshHeader(file)
-
-        elif Chunktype == 32:
-            MeshFaces = ReadMeshFaceArray(file, subChunkEnd)
-
-        elif Chunktype == 34:
-            MeshShadeIds = ReadLongArray(file, subChunkEnd)
-
-        elif Chunktype == 40:
-            MeshMaterialInfo = ReadMeshMaterialSetInfo(file)
-
-        elif Chunktype == 41:
-            MeshShaders = ReadMeshShaderArray(file, subChunkEnd)
-
-        elif Chunktype == 42:
-            MeshVerticeMats = ReadMeshMaterialArray(file, subChunkEnd)
+    return ReadChunks(file, chunkEnd, 0)
 
-        elif Chunktype == 48:
-            MeshTextures = ReadTextureArray(file, subChunkEnd)
-
-        elif Chunktype == 56:
-            MeshMaterialPass = ReadMeshMaterialPass(file, subChunkEnd)
-
-        elif Chunktype == 80:
-            MeshBumpMaps = ReadBumpMapArray(file, subChunkEnd)
-
-        elif Chunktype == 96:
-            #seems to be a type of vertex normals occur only in combination with normal maps
-            ReadMeshVerticesArray(file, subChunkEnd)
+#######################################################################################
+# Chunk registry
+#######################################################################################
 
-        elif Chunktype == 97:
-            #seems to be a type of vertex normals occur only in combination with normal maps
-            ReadMeshVerticesArray(file, subChunkEnd)
+class Field(object):
+    """
+    Where a decoded sub chunk goes in its parent: the attribute name (dotted
+    for nested structs, None for the parent list itself) and the decoder
+    called with (file, chunkEnd). A field without decoder is a known chunk
+    that is skipped.
+    """
+    __slots__ = ("path", "name", "decode", "append", "update")
+
+    def __init__(self, name, decode=None, append=False, update=False):
+        parts = name.split(".") if name else [None]
+        self.path = parts[:-1]
+        self.name = parts[-1]
+        self.decode = decode
+        self.append = append    # add to a list instead of replacing the value
+        self.update = update    # the decoder gets the current value as third argument
+
+    def store(self, target, file, chunkEnd):
+        for part in self.path:
+            target = getattr(target, part)
+        if self.append:
+            (target if self.name is None else getattr(target, self.name)).append(self.decode(file, chunkEnd))
+        elif self.update:
+            setattr(target, self.name, self.decode(file, chunkEnd, getattr(target, self.name)))
+        else:
+            setattr(target, self.name, self.decode(file, chunkEnd))
+
+def Record(reader):
+    """ decoder of a fixed layout chunk, the reader doesn't need the chunk end """
+    return lambda file, chunkEnd: reader(file)
+
+# container chunk type -> (name, struct it is decoded into, sub chunk type -> Field)
+CHUNK_SCHEMAS = {
+    0: ("Mesh", struct_w3d.Mesh, {
+        2: Field("verts", ReadMeshVerticesArray),
+        3: Field("normals", ReadMeshVerticesArray),
+        12: Field("userText", Record(ReadString)),
+        14: Field("vertInfs", ReadMeshVertexInfluences),
+        31: Field("header", Record(ReadMeshHeader)),
+        32: Field("faces", ReadMeshFaceArray),
+        34: Field("shadeIds", ReadLongArray),
+        40: Field("matInfo", Record(ReadMeshMaterialSetInfo)),
+        41: Field("shaders", ReadMeshShaderArray),
+        42: Field("vertMatls", ReadMeshMaterialArray),
+        48: Field("textures", ReadTextureArray),
+        56: Field("matlPass", ReadMeshMaterialPass),
+        80: Field("bumpMaps", ReadBumpMapArray),
+        96: Field(None),    # seem to be vertex normals, only together with normal maps
+        97: Field(None),
+        144: Field("aabtree", ReadAABTree),
+        3072: Field("verts_copy", ReadMeshVerticesArray),
+        3073: Field("normals_copy", ReadMeshVerticesArray),
+    }),
+    42: ("MeshMaterialArray", list, {
+        43: Field(None, ReadMaterial, append=True),
+    }),
+    43: ("Material", struct_w3d.MeshMaterial, {
+        44: Field("vmName", Record(ReadString)),
+        45: Field("vmInfo", Record(ReadVertexMaterial)),
+        46: Field("vmArgs0", Record(ReadString)),
+        47: Field("vmArgs1", Record(ReadString)),
+    }),
+    48: ("TextureArray", list, {
+        49: Field(None, ReadTexture, append=True),
+    }),
+    49: ("Texture", struct_w3d.Texture, {
+        50: Field("name", Record(ReadString)),
+        51: Field("textureInfo", Record(ReadTextureInfo)),
+    }),
+    56: ("MeshMaterialPass", struct_w3d.MeshMaterialPass, {
+        57: Field("vmIds", ReadLongArray),
+        58: Field("shaderIds", ReadLongArray),
+        59: Field("dcg", ReadRGBAArray),
+        63: Field(None),    # dont know what this is -> size is always 4 and value 0
+        72: Field("txStage", ReadMeshTextureStage),
+        74: Field("txStage.txCoords", ReadMeshTextureCoordArray),
+    }),
+    72: ("MeshTextureStage", struct_w3d.MeshTextureStage, {
+        73: Field("txIds", ReadLongArray),
+        74: Field("txCoords", ReadMeshTextureCoordArray),
+    }),
+    80: ("BumpMapArray", struct_w3d.MeshBumpMapArray, {
+        81: Field("normalMap", ReadNormalMap),
+    }),
+    81: ("NormalMap", struct_w3d.MeshNormalMap, {
+        82: Field("header", ReadNormalMapHeader),
+        83: Field("entryStruct", ReadNormalMapEntryStruct, update=True),
+    }),
+    144: ("AABTree", struct_w3d.MeshAABTree, {
+        145: Field("header", ReadAABTreeHeader),
+        146: Field("polyIndices", ReadAABTreePolyIndices),
+        147: Field("nodes", ReadAABTreeNodes),
+    }),
+    256: ("Hierarchy", struct_w3d.Hierarchy, {
+        257: Field("header", Record(ReadHierarchyHeader)),
+        258: Field("pivots", ReadPivots),
+        259: Field("pivot_fixups", ReadPivotFixups),
+    }),
+    512: ("Animation", struct_w3d.Animation, {
+        513: Field("header", Record(ReadAnimationHeader)),
+        514: Field("channels", ReadAnimationChannel, append=True),
+    }),
+    640: ("CompressedAnimation", struct_w3d.CompressedAnimation, {
+        641: Field("header", Record(ReadCompressedAnimationHeader)),
+        642: Field("channels", ReadTimeCodedAnimationChannel, append=True),
+        643: Field(None),   # time coded bit channels, not implemented yet
+        644: Field(None),   # time coded animation vectors, not implemented yet
+    }),
+    1792: ("HLod", struct_w3d.HLod, {
+        1793: Field("header", Record(ReadHLodHeader)),
+        1794: Field("lodArray", ReadHLodArray),
+    }),
+    1794: ("HLodArray", struct_w3d.HLodArray, {
+        1795: Field("header", Record(ReadHLodArrayHeader)),
+        1796: Field("subObjects", Record(ReadHLodSubObject), append=True),
+    }),
+}
+
+# chunk types whose payload is a list of sub chunks
+CONTAINER_CHUNKS = frozenset(CHUNK_SCHEMAS)
+
+# top level chunk type -> W3DModel attribute
+FILE_CHUNKS = {
+    0: Field("meshes", ReadMesh, append=True),
+    256: Field("hierarchy", ReadHierarchy),
+    512: Field("animation", ReadAnimation),
+    640: Field("compressed_animation", ReadCompressedAnimation),
+    1792: Field("hlod", ReadHLod),
+    1856: Field("box", Record(ReadBox)),
+}
+
+def ReadChunks(file, chunkEnd, chunkType):
+    """
+    Decode a container chunk with its schema: every sub chunk is looked up by
+    type and stored into its field, unknown ones are logged and seeked past.
+    """
+    name, Cls, fields = CHUNK_SCHEMAS[chunkType]
+    result = Cls()
+    while file.tell() + 8 <= chunkEnd:
+        subChunkType = ReadLong(file)
+        subChunkSize = GetChunkSize(ReadLong(file))
+        subChunkEnd = file.tell() + subChunkSize
+        if subChunkEnd > chunkEnd:
+            logger.error("truncated chunk %s in %s" % (subChunkType, name))
+            break
+        field = fields.get(subChunkType)
+        if field is None:
+            logger.error("unknown chunktype in %s: %s" % (name, subChunkType))
+        elif field.decode is not None:
+            field.store(result, file, subChunkEnd)
+        file.seek(subChunkEnd)
+    file.seek(chunkEnd)
+    return result
 
-        elif Chunktype == 144:
-            MeshAABTree = ReadAABTree(file, subChunkEnd)
+#######################################################################################
+# Streaming
+#######################################################################################
 
+class ChunkPayload(object):
+    """
+    The payload of a chunk met by iter_chunks, nothing is read until asked
+    for. read() and decode() only work while the iteration runs, a view()
+    keeps its part of the file mapped for as long as it is referenced.
+    """
+    __slots__ = ("file", "path", "offset", "size")
+
+    def __init__(self, file, path, offset, size):
+        self.file = file
+        self.path = path
+        self.offset = offset
+        self.size = size
+
+    def __repr__(self):
+        return "<ChunkPayload %s @%s+%s>" % ("/".join(map(str, self.path)), self.offset, self.size)
+
+    def view(self):
+        """ zero-copy memoryview of the payload """
+        self.file.seek(self.offset)
+        return self.file.view(self.size)
+
+    def read(self):
+        return self.view().tobytes()
+
+    def decode(self):
+        """ the payload decoded like W3DModel does, None for chunks without decoder """
+        chunkType = self.path[-1]
+        if len(self.path) == 1:
+            field = FILE_CHUNKS.get(chunkType)
         else:
-            logger.error("Unknown chunktype in Mesh: %s" % Chunktype)
-            file.seek(Chunksize,1)
-
-    return struct_w3d.Mesh(header = MeshHeader, verts = MeshVertices, verts_copy = MeshVerticesCopy, normals = MeshNormals,
-                normals_copy = MeshNormalsCopy, vertInfs = MeshVerticesInfs, faces = MeshFaces, userText = MeshUsertext,
-                shadeIds = MeshShadeIds, matInfo = MeshMaterialInfo, shaders = MeshShaders, vertMatls = MeshVerticeMats,
-                textures = MeshTextures, matlPass = MeshMaterialPass, bumpMaps = MeshBumpMaps, aabtree = MeshAABTree)
+            name, Cls, fields = CHUNK_SCHEMAS[self.path[-2]]
+            field = fields.get(chunkType)
+        if field is None or field.decode is None:
+            return None
+        self.file.seek(self.offset)
+        if field.update:
+            return field.decode(self.file, self.offset + self.size, getattr(Cls(), field.name))
+        return field.decode(self.file, self.offset + self.size)
+
+def WalkChunks(file, offset, chunkEnd, parents=(), decode=()):
+    """ generator behind iter_chunks over the chunks between offset and chunkEnd """
+    while offset + 8 <= chunkEnd:
+        # the consumer may have moved the reader in between
+        file.seek(offset)
+        chunkType = ReadLong(file)
+        size = GetChunkSize(ReadLong(file))
+        offset += 8
+        if offset + size > chunkEnd:
+            logger.error("truncated chunk %s at %s" % (chunkType, offset))
+            return
+        path = parents + (chunkType,)
+        payload = ChunkPayload(file, path, offset, size)
+        if chunkType in decode:
+            yield path, offset, size, payload.decode()
+        else:
+            yield path, offset, size, payload
+            if chunkType in CONTAINER_CHUNKS:
+                yield from WalkChunks(file, offset, offset + size, path, decode)
+        offset += size
+
+def iter_chunks(path, decode=()):
+    """
+    Walk a w3d file chunk by chunk without building a W3DModel. Yields
+    (path, offset, size, payload) in file order, path being the chunk types
+    from the top level down to the chunk, e.g. (0, 42, 43) for a material.
+
+    Chunk types in decode are decoded right away and their sub chunks are not
+    walked: decode={0} yields one finished Mesh at a time. All other chunks
+    get a lazy ChunkPayload, containers are followed by their sub chunks. The
+    file is memory mapped, so only the chunks looked at are paged in.
+    """
+    with ChunkReader.from_file(path) as file:
+        yield from WalkChunks(file, 0, len(file), decode=frozenset(decode))
 
 #######################################################################################
 # loadTexture
@@ -955,9 +1014,9 @@ def createArmature(self, Hierarchy, amtName, subObjects):
             parent = amt.edit_bones[parent_pivot.name]
             bone.parent = parent
             size = pivot.position.x
-        bone.head = Vector((0.0, 0.0, 0.0))
+        bone.head = Vector3((0.0, 0.0, 0.0))
         #has to point in y direction that the rotation is applied correctly
-        bone.tail = Vector((0.0, 0.1, 0.0))
+        bone.tail = Vector3((0.0, 0.1, 0.0))
 
     #pose the bones
     bpy.ops.object.mode_set(mode = 'POSE')
@@ -1061,7 +1120,7 @@ def createAnimation(self, Animation, Hierarchy, rig, compressed):
     for pivot in range(1, len(Hierarchy.pivots)):
         rest_location = Hierarchy.pivots[pivot].position
         rest_rotation = Hierarchy.pivots[pivot].rotation
-        lastFrameLocation = Vector((0.0, 0.0, 0.0))
+        lastFrameLocation = Vector3((0.0, 0.0, 0.0))
         try:
             obj = rig.pose.bones[Hierarchy.pivots[pivot].name]
         except:
@@ -1069,7 +1128,7 @@ def createAnimation(self, Animation, Hierarchy, rig, compressed):
 
         for frame in range (0, Animation.header.numFrames):
             bpy.context.scene.frame_set(frame)
-            pos = Vector((0.0, 0.0, 0.0))
+            pos = Vector3((0.0, 0.0, 0.0))
 
             if not translation_data[pivot][frame][0] == None:
                 pos[0] = translation_data[pivot][frame][0]
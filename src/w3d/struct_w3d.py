@@ -1,18 +1,73 @@
 #Written by Stephan Vedder and Michael Schnabel
 #Last Modification 08.07.2015
 #Structs of the W3D Format used in games by Westwood & EA
-from mathutils import Vector, Quaternion
-
-class Struct():
-    def __init__ (self, *argv, **argd):
-        if len(argd):
-            # Update by dictionary
-            self.__dict__.update (argd)
-        else:
-            # Update by position
-            attrs = filter (lambda x: x[0:2] != "__", dir(self))
-            for n in range(len(argv)):
-                setattr(self, attrs[n], argv[n])
+import copy
+from collections import OrderedDict
+
+import numpy
+from .vecmath import Vector3, Quaternion
+
+
+def defaultFactory(value):
+    """ a function returning a fresh copy of a field default """
+    if value is None or isinstance(value, (bool, int, float, str, bytes, tuple)):
+        return lambda: value
+    if isinstance(value, list):
+        return lambda: list(value)
+    if isinstance(value, numpy.ndarray):
+        return value.copy
+    if isinstance(value, (Vector3, Quaternion)):
+        return lambda: type(value)(value)
+    if isinstance(value, Struct):
+        # nested struct defaults are always written as Cls()
+        return type(value)
+    return lambda: copy.deepcopy(value)
+
+class StructMeta(type):
+    """
+    Turns the class attributes of a Struct into slotted fields, in the order
+    they are written. Every instance gets fresh copies of the defaults, so no
+    two instances share a list or vector.
+    """
+    @classmethod
+    def __prepare__(metacls, name, bases):
+        return OrderedDict()
+
+    def __new__(metacls, name, bases, namespace):
+        fields = OrderedDict()
+        for base in reversed(bases):
+            fields.update(getattr(base, "_defaults", {}))
+        own = OrderedDict()
+        for key, value in list(namespace.items()):
+            if not key.startswith("__") and not callable(value) and not isinstance(value, (classmethod, staticmethod, property)):
+                own[key] = namespace.pop(key)
+        fields.update(own)
+
+        namespace = dict(namespace)
+        namespace["__slots__"] = tuple(own)
+        Cls = type.__new__(metacls, name, bases, namespace)
+        Cls._fields = tuple(fields)
+        Cls._defaults = fields
+        Cls._factories = tuple((key, defaultFactory(value)) for key, value in fields.items())
+        return Cls
+
+class Struct(metaclass=StructMeta):
+    def __init__(self, *argv, **argd):
+        if len(argv) > len(self._fields):
+            raise TypeError("%s takes at most %d arguments" % (self.__class__.__name__, len(self._fields)))
+        # Update by position, then by name, the rest gets defaults
+        for key, value in zip(self._fields, argv):
+            setattr(self, key, value)
+        for key, value in argd.items():
+            if key not in self._defaults:
+                raise TypeError("%s has no field %r" % (self.__class__.__name__, key))
+            setattr(self, key, value)
+        for key, factory in self._factories[len(argv):]:
+            if key not in argd:
+                setattr(self, key, factory())
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join("%s=%r" % (key, getattr(self, key)) for key in self._fields))
 
 #######################################################################################
 # Basic Structs
@@ -36,13 +91,13 @@ class HierarchyHeader(Struct):
     version = Version()
     name = ""
     pivotCount = 0
-    centerPos = Vector((0.0, 0.0 ,0.0))
+    centerPos = Vector3((0.0, 0.0 ,0.0))
 
 class HierarchyPivot(Struct):
     name = ""
     parentID = -1
-    position = Vector((0.0, 0.0 ,0.0))
-    eulerAngles = Vector((0.0, 0.0 ,0.0))
+    position = Vector3((0.0, 0.0 ,0.0))
+    eulerAngles = Vector3((0.0, 0.0 ,0.0))
     rotation = Quaternion((1.0, 0.0, 0.0, 0.0))
 
 class Hierarchy(Struct):
@@ -141,8 +196,8 @@ class Box(Struct):
     attributes = 1
     name = ""
     color = RGBA()
-    center = Vector((0.0, 0.0 ,0.0))
-    extend = Vector((0.0, 0.0 ,0.0))
+    center = Vector3((0.0, 0.0 ,0.0))
+    extend = Vector3((0.0, 0.0 ,0.0))
 
 #######################################################################################
 # Texture
@@ -209,11 +264,13 @@ class MeshVertexInfluences(Struct):
 # Faces
 #######################################################################################
 
-class MeshFace(Struct):
-    vertIds = []
-    attrs = 13 # SURFACE_TYPE_DEFAULT
-    normal = Vector((0.0, 0.0 ,0.0))
-    distance = 0.0 #distance from the face to the mesh center
+# fixed 32 byte record of the face array chunk, faces are decoded column-wise into this
+MESH_FACE_DTYPE = numpy.dtype([
+    ("vertIds", "<u4", 3),
+    ("attrs", "<u4"),           # surface type, 13 is the default
+    ("normal", "<f4", 3),
+    ("distance", "<f4"),        # distance from the face to the mesh center
+])
 
 #######################################################################################
 # Shader
@@ -275,8 +332,8 @@ class AABTreeHeader(Struct):
     polyCount = 0
 
 class AABTreeNode(Struct):
-    min = Vector((0.0, 0.0, 0.0))
-    max = Vector((0.0, 0.0, 0.0))
+    min = Vector3((0.0, 0.0, 0.0))
+    max = Vector3((0.0, 0.0, 0.0))
     frontOrPoly0 = 0
     backOrPolyCount = 0
 
@@ -303,19 +360,19 @@ class MeshHeader(Struct):
     futureCount = 0
     vertChannelCount = 3
     faceChannelCount = 1
-    minCorner = Vector((0.0, 0.0 ,0.0))
-    maxCorner = Vector((0.0, 0.0 ,0.0))
-    sphCenter = Vector((0.0, 0.0 ,0.0))
+    minCorner = Vector3((0.0, 0.0 ,0.0))
+    maxCorner = Vector3((0.0, 0.0 ,0.0))
+    sphCenter = Vector3((0.0, 0.0 ,0.0))
     sphRadius = 0.0
 
 class Mesh(Struct):
     header = MeshHeader()
-    verts = []
-    verts_copy = []
-    normals = []
-    normals_copy = []
+    verts = numpy.zeros((0, 3), numpy.float32)          # (N, 3) float32
+    verts_copy = numpy.zeros((0, 3), numpy.float32)
+    normals = numpy.zeros((0, 3), numpy.float32)
+    normals_copy = numpy.zeros((0, 3), numpy.float32)
     vertInfs = []
-    faces = []
+    faces = numpy.zeros(0, MESH_FACE_DTYPE)             # structured, see MESH_FACE_DTYPE
     userText  = ""
     shadeIds = []
     matInfo = MeshMaterialSetInfo()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of converted textures
+
+Entries are named after a hash of the source file content and the conversion
+parameters, so a texture shared by many models is converted once. Reading an
+entry touches it, eviction removes the least recently used entries until the
+cache fits into its size limit again.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+
+import logging
+logger = logging.getLogger("W3DModel.w3d.texturecache")
+
+
+# bump when the converters change their output
+VERSION = 1
+
+
+class TextureCache(object):
+
+    def __init__(self, root, max_bytes=1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(root)
+        except FileExistsError:
+            pass
+
+    def key(self, source, **params):
+        """ hash of the content of source and the conversion parameters """
+        digest = hashlib.sha1()
+        with open(source, "rb") as fr:
+            for block in iter(lambda: fr.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(repr((VERSION, sorted(params.items()))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ path of the cached output for key, None if there is none """
+        for path in glob.glob(os.path.join(self.root, key + ".*")):
+            if path.endswith(".tmp"):
+                continue
+            try:
+                os.utime(path, None)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            return path
+        return None
+
+    def put(self, key, file):
+        """ store a copy of file, keeps its extension """
+        path = os.path.join(self.root, key + os.path.splitext(file)[1])
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        shutil.copyfile(file, tmp)
+        os.replace(tmp, path)  # readers never see partial files
+        self.evict()
+        return path
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".tmp"):  # still being written
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug("evict: %s" % path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
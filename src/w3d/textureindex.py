@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Case-insensitive lookup of texture files below the texture roots
+
+Every directory is listed once per process and the listing is shared by all
+models, so resolving an image costs dictionary lookups instead of a stat per
+root and extension (slow on network storage). Names match regardless of case,
+textures referenced as "Tree.dds" are found as "tree.DDS" on disk.
+"""
+
+import os
+
+
+class TextureIndex(object):
+    _listings = {}  # directory -> { lowercased entry name: entry name }
+
+    @classmethod
+    def listing(Cls, directory):
+        try:
+            return Cls._listings[directory]
+        except KeyError:
+            try:
+                names = os.listdir(directory)
+            except (FileNotFoundError, NotADirectoryError):
+                names = []
+            listing = Cls._listings[directory] = { name.lower(): name for name in names }
+            return listing
+
+    @classmethod
+    def lookup(Cls, root, path):
+        """ path as found below root, path is matched case-insensitively """
+        found = []
+        directory = root
+        for part in path.replace("\\", "/").split("/"):
+            if not part:
+                continue
+            name = Cls.listing(directory).get(part.lower())
+            if name is None:
+                return None
+            found.append(name)
+            directory = os.path.join(directory, name)
+        return "/".join(found)
+
+    @classmethod
+    def find(Cls, path, extensions, roots):
+        """
+        (root, relative path) of the first match trying the extensions in
+        order, each in all roots. None if there is none.
+        """
+        for ext in extensions:
+            for root in roots:
+                found = Cls.lookup(root, path + ext)
+                if found is not None:
+                    return root, found
+        return None
+
+    @classmethod
+    def clear(Cls):
+        """ forget all listings, e.g. after files were added """
+        Cls._listings.clear()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+A loader for .TGA (Truevision TARGA) files
+
+The TGA file format is described at:
+ http://www.dca.fee.unicamp.br/~martino/disciplinas/ea978/tgaffs.pdf
+
+Supported are true color (15/16/24/32 bit), grayscale and color mapped
+images, uncompressed and run length encoded, in any of the four origins.
+"""
+
+from struct import unpack
+
+import numpy
+from PIL import Image, ImageFile
+
+from .decoder import decodeRLE, toRGB, lookup, orient
+
+
+
+
+# image types
+TGA_COLORMAPPED     = 1
+TGA_TRUECOLOR       = 2
+TGA_GRAYSCALE       = 3
+TGA_RLE_COLORMAPPED = 9
+TGA_RLE_TRUECOLOR   = 10
+TGA_RLE_GRAYSCALE   = 11
+
+TGA_RLE = 8 # flag of the rle types
+
+# image descriptor
+TGA_ALPHA_BITS    = 0x0f
+TGA_RIGHT_TO_LEFT = 0x10
+TGA_TOP_TO_BOTTOM = 0x20
+
+
+class TGA(ImageFile.ImageFile):
+    format = "TGA"
+    format_description = "Truevision TARGA image"
+
+    def _open(self):
+        self._loaded = 0
+
+        header = self.fp.read(18)
+        if len(header) != 18:
+            raise ValueError("Not a TGA file")
+
+        idLength, colorMapType, imageType, colorMapStart, colorMapLength, colorMapDepth, \
+            xOrigin, yOrigin, width, height, depth, descriptor = unpack("<BBBHHBHHHHBB", header)
+
+        if imageType & ~TGA_RLE not in (TGA_COLORMAPPED, TGA_TRUECOLOR, TGA_GRAYSCALE) or colorMapType > 1:
+            raise ValueError("Unsupported TGA image type: %d" % (imageType))
+        if width == 0 or height == 0:
+            raise ValueError("Empty TGA image")
+
+        self._size = width, height
+        self._imageType = imageType
+        self._depth = depth
+        self._descriptor = descriptor
+        self._alpha = bool(descriptor & TGA_ALPHA_BITS)
+        self._colorMap = None
+
+        self.fp.seek(idLength, 1)
+        if colorMapType and imageType & ~TGA_RLE != TGA_COLORMAPPED:
+            # allowed but unused by true color and grayscale images
+            self.fp.seek(colorMapLength * ((colorMapDepth + 7) // 8), 1)
+        elif colorMapType:
+            entrySize = (colorMapDepth + 7) // 8
+            entries = numpy.frombuffer(self.fp.read(colorMapLength * entrySize), numpy.uint8)
+            if len(entries) != colorMapLength * entrySize:
+                raise ValueError("Truncated TGA color map")
+            self._colorMap = numpy.zeros((colorMapStart + colorMapLength, 4 if colorMapDepth == 32 else 3), numpy.uint8)
+            self._colorMap[colorMapStart:] = toRGB(entries.reshape(-1, entrySize), colorMapDepth, colorMapDepth == 32)
+            self._alpha = colorMapDepth == 32 and self._alpha
+            if not self._alpha:
+                self._colorMap = self._colorMap[:, :3]
+        self._offset = self.fp.tell()
+
+        if imageType & ~TGA_RLE == TGA_GRAYSCALE:
+            if depth != 8:
+                raise ValueError("Unsupported TGA grayscale depth: %d" % (depth))
+            self._mode = "L"
+        elif imageType & ~TGA_RLE == TGA_COLORMAPPED:
+            if self._colorMap is None:
+                raise ValueError("TGA color mapped image without color map")
+            if depth not in (8, 16):
+                raise ValueError("Unsupported TGA index depth: %d" % (depth))
+            self._mode = "RGBA" if self._alpha else "RGB"
+        else:
+            if depth not in (15, 16, 24, 32):
+                raise ValueError("Unsupported TGA depth: %d" % (depth))
+            self._alpha = self._alpha and depth != 24
+            self._mode = "RGBA" if self._alpha else "RGB"
+
+        self.load = self._loadTGA
+
+    def _loadTGA(self):
+        if self._loaded: return
+
+        width, height = self.size
+        bytesPerPixel = (self._depth + 7) // 8
+        self.fp.seek(self._offset)
+        if self._imageType & TGA_RLE:
+            pixels, length = decodeRLE(self.fp.read(), width * height, bytesPerPixel)
+        else:
+            data = self.fp.read(width * height * bytesPerPixel)
+            if len(data) != width * height * bytesPerPixel:
+                raise ValueError("Truncated TGA data")
+            pixels = numpy.frombuffer(data, numpy.uint8).reshape(-1, bytesPerPixel)
+
+        if self._colorMap is not None:
+            pixels = lookup(pixels, self._colorMap)
+        else:
+            pixels = toRGB(pixels, self._depth, self._alpha)
+        pixels = orient(pixels, width, height, self._descriptor & TGA_TOP_TO_BOTTOM, self._descriptor & TGA_RIGHT_TO_LEFT)
+
+        self.im = Image.core.new(self.mode, self.size)
+        self.frombytes(pixels.tobytes())
+        self._loaded = 1
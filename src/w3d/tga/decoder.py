@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+TGA pixel decoders
+
+RLE data is scanned packet by packet for the packet headers only, the pixels
+are then gathered with numpy for all packets at once. Raw and decompressed
+pixels are converted from BGR(A) / 5-5-5 / color map indices to rgb(a) in
+bulk. The result is a (height, width, channels) uint8 array.
+"""
+
+import numpy
+
+
+def decodeRLE(data, pixelCount, bytesPerPixel):
+    """
+    input: run length encoded pixels
+    output: the decompressed pixel bytes as (pixelCount, bytesPerPixel) array
+    and the number of bytes consumed
+    """
+    heads, counts = [], []
+    pos = 0
+    remaining = pixelCount
+    size = len(data)
+    while remaining > 0:
+        if pos >= size:
+            raise ValueError("Truncated RLE data")
+        header = data[pos]
+        count = (header & 0x7f) + 1
+        heads.append(pos)
+        counts.append(count)
+        pos += 1 + (bytesPerPixel if header & 0x80 else count * bytesPerPixel)
+        remaining -= count
+    if pos > size:
+        raise ValueError("Truncated RLE data")
+
+    heads = numpy.array(heads, numpy.int64)
+    counts = numpy.array(counts, numpy.int64)
+    runs = numpy.frombuffer(data, numpy.uint8)[heads] >= 0x80
+
+    # for every pixel: its packet and its index inside the packet
+    packet = numpy.repeat(numpy.arange(len(heads)), counts)
+    index = numpy.arange(len(packet)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    # run packets repeat their single pixel, raw packets list them
+    offsets = heads[packet] + 1 + numpy.where(runs[packet], 0, index * bytesPerPixel)
+
+    # every byte offset viewed as the start of a pixel, gathered a whole pixel at a time
+    raw = numpy.frombuffer(data, numpy.uint8, count=pos)
+    starts = numpy.lib.stride_tricks.as_strided(raw, shape=(pos - bytesPerPixel + 1, bytesPerPixel), strides=(1, 1))
+    return starts[offsets[:pixelCount]], pos
+
+
+def unpack555(color, alpha=False):
+    """ packed a-5-5-5 colors -> (..., 3) rgb or (..., 4) rgba """
+    color = color.astype(numpy.uint16)
+    channels = [
+        ((color >> 10) & 0x1f) << 3 | ((color >> 12) & 0x7),
+        ((color >> 5) & 0x1f) << 3 | ((color >> 7) & 0x7),
+        (color & 0x1f) << 3 | ((color >> 2) & 0x7),
+    ]
+    if alpha:
+        channels.append(numpy.where(color & 0x8000, 255, 0))
+    return numpy.stack(channels, axis=-1).astype(numpy.uint8)
+
+
+def toRGB(pixels, bitsPerPixel, alpha=False):
+    """ (pixels, bytesPerPixel) tga pixel bytes -> (pixels, channels) rgb(a) """
+    if bitsPerPixel == 8:
+        return pixels[:, :1].copy()
+    if bitsPerPixel in (15, 16):
+        return unpack555(pixels[:, 0] | pixels[:, 1].astype(numpy.uint16) << 8, alpha)
+    channels = 4 if alpha and bitsPerPixel == 32 else 3
+    rgb = pixels[:, :channels].copy()
+    rgb[:, [0, 2]] = rgb[:, [2, 0]]     # bgr(a) -> rgb(a)
+    return rgb
+
+
+def lookup(indices, colorMap):
+    """ (pixels, bytesPerIndex) index bytes -> rows of colorMap """
+    index = numpy.zeros(len(indices), numpy.int64)
+    for i in range(indices.shape[1]):
+        index |= indices[:, i].astype(numpy.int64) << (8 * i)
+    return colorMap[numpy.clip(index, 0, len(colorMap) - 1)]
+
+
+def orient(pixels, width, height, topToBottom, rightToLeft):
+    """ pixels in file order -> (height, width, channels) top left first """
+    image = pixels.reshape(height, width, -1)
+    if not topToBottom:
+        image = image[::-1]
+    if rightToLeft:
+        image = image[:, ::-1]
+    return numpy.ascontiguousarray(image)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Small vector, quaternion and matrix types
+
+Replaces the parts of Blender's mathutils the converter uses, so it runs in a
+plain python without Blender. Quaternions are stored w first like mathutils,
+matrices are lists of rows.
+"""
+
+import math
+
+
+def sequenceOf(value, length):
+    """ value as tuple if it is a sequence of that length, else None """
+    try:
+        if len(value) != length:
+            return None
+        return tuple(value)
+    except TypeError:
+        return None
+
+
+class Vector3(object):
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self.x, self.y, self.z = values
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.z)[index]
+
+    def __setitem__(self, index, value):
+        setattr(self, self.__slots__[index], value)
+
+    def __eq__(self, other):
+        other = sequenceOf(other, len(self))
+        if other is None:
+            return NotImplemented
+        return tuple(self) == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Vector3((%r, %r, %r))" % (self.x, self.y, self.z)
+
+    def __add__(self, other):
+        return Vector3((self.x + other[0], self.y + other[1], self.z + other[2]))
+
+    def __sub__(self, other):
+        return Vector3((self.x - other[0], self.y - other[1], self.z - other[2]))
+
+    def __mul__(self, scalar):
+        return Vector3((self.x * scalar, self.y * scalar, self.z * scalar))
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Vector3((-self.x, -self.y, -self.z))
+
+    @property
+    def length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def dot(self, other):
+        return self.x * other[0] + self.y * other[1] + self.z * other[2]
+
+    def cross(self, other):
+        return Vector3((
+            self.y * other[2] - self.z * other[1],
+            self.z * other[0] - self.x * other[2],
+            self.x * other[1] - self.y * other[0],
+        ))
+
+    def copy(self):
+        return Vector3(self)
+
+    def to_tuple(self, precision=None):
+        if precision is None:
+            return (self.x, self.y, self.z)
+        return tuple(round(value, precision) for value in self)
+
+
+class Quaternion(object):
+    __slots__ = ("w", "x", "y", "z")
+
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0)):
+        self.w, self.x, self.y, self.z = values
+
+    def __iter__(self):
+        yield self.w
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return (self.w, self.x, self.y, self.z)[index]
+
+    def __setitem__(self, index, value):
+        setattr(self, self.__slots__[index], value)
+
+    def __eq__(self, other):
+        other = sequenceOf(other, len(self))
+        if other is None:
+            return NotImplemented
+        return tuple(self) == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Quaternion((%r, %r, %r, %r))" % (self.w, self.x, self.y, self.z)
+
+    def __mul__(self, other):
+        """ quaternion product, or a vector rotated by the quaternion """
+        if isinstance(other, Quaternion):
+            w1, x1, y1, z1 = self
+            w2, x2, y2, z2 = other
+            return Quaternion((
+                w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            ))
+        if isinstance(other, Vector3):
+            return Vector3([ row[0] * other.x + row[1] * other.y + row[2] * other.z for row in self.to_matrix() ])
+        return NotImplemented
+
+    def conjugated(self):
+        return Quaternion((self.w, -self.x, -self.y, -self.z))
+
+    def normalized(self):
+        length = math.sqrt(sum(value * value for value in self))
+        if not length:
+            return Quaternion()
+        return Quaternion([ value / length for value in self ])
+
+    def copy(self):
+        return Quaternion(self)
+
+    def to_tuple(self, precision=None):
+        if precision is None:
+            return (self.w, self.x, self.y, self.z)
+        return tuple(round(value, precision) for value in self)
+
+    def to_matrix(self):
+        """ 3x3 rotation matrix """
+        w, x, y, z = self
+        return Matrix([
+            [1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+            [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+            [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+        ])
+
+
+class Matrix(object):
+    __slots__ = ("rows",)
+
+    def __init__(self, rows):
+        self.rows = [ list(row) for row in rows ]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __eq__(self, other):
+        rows = sequenceOf(other, len(self))
+        if rows is None or any(sequenceOf(row, len(mine)) is None for row, mine in zip(rows, self)):
+            return NotImplemented
+        return [ list(row) for row in self ] == [ list(row) for row in rows ]
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Matrix(%r)" % (self.rows,)
+
+    def to_4x4(self):
+        """ 3x3 -> 4x4 with no translation """
+        rows = [ row[:3] + [0.0] for row in self.rows[:3] ]
+        return Matrix(rows + [[0.0, 0.0, 0.0, 1.0]])
+
+    def to_tuple(self):
+        return tuple(tuple(row) for row in self.rows)